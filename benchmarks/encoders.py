@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""Compares the available JSON backends on documents that are built from the
+fixture models.
+
+Usage: python benchmarks/encoders.py [articles]
+"""
+
+import sys
+import timeit
+
+from peewee import SqliteDatabase
+from webtest import TestApp
+
+from corkscrew import CorkscrewApplication, Link
+from corkscrew.encoders import available_encoders
+from corkscrew.handlers import PeeweeHandlerFactory as PHF
+from corkscrew.fixtures import insertFixtures, database
+from corkscrew.fixtures import Comment, Person, Photo, Article, Tag, PhotoTag
+
+
+URL = "/articles?page[size]=1000&include=comments,author"
+
+
+def create_app(encoder):
+    app = CorkscrewApplication(PHF, encoder=encoder)
+    app.register(Comment, endpoint="/comments")
+    app.register(Person, related={"articles": Article}, endpoint="/people")
+    app.register(
+        Photo,
+        related={"tags": Link(Tag, via=PhotoTag)},
+        endpoint="/photos"
+    )
+    app.register(Article, related={"comments": Comment}, endpoint="/articles")
+
+    return TestApp(app)
+
+
+def main(articles):
+    database.initialize(SqliteDatabase(":memory:"))
+    insertFixtures()
+
+    with database.atomic():
+        for i in xrange(articles):
+            article = Article.create(title="Article {}".format(i), author=1)
+            for j in xrange(3):
+                Comment.create(body="Comment", article=article, author=2)
+
+    doc = create_app(None).get(URL).json
+
+    print "{:<12} {:<10} {:>10} {:>10} {:>10}".format(
+        "backend", "sort_keys", "dumps", "loads", "request"
+    )
+
+    for encoder in available_encoders():
+        for sort_keys in (True, False):
+            instance = encoder(sort_keys=sort_keys)
+            body = instance.dumps(doc)
+            app = create_app(instance)
+
+            print "{:<12} {:<10} {:>9.2f}ms {:>9.2f}ms {:>9.2f}ms".format(
+                encoder.name,
+                str(sort_keys),
+                timeit.timeit(lambda: instance.dumps(doc), number=20) * 50,
+                timeit.timeit(lambda: instance.loads(body), number=20) * 50,
+                timeit.timeit(lambda: app.get(URL), number=3) * 1000 / 3
+            )
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 500)
@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""Compares the JSON API validator with the implementation it replaced
+(benchmarks/legacy_validator.py) on a bulk payload and makes sure that both
+report the same errors.
+
+Usage: python benchmarks/validator.py [resources]
+"""
+
+import sys
+import timeit
+
+from corkscrew.jsonapi import JsonAPIValidator
+from legacy_validator import JsonAPIValidator as LegacyValidator
+
+
+# documents with errors (and some edge cases without)
+DOCUMENTS = [
+    [],
+    {},
+    {u"data": None, u"errors": []},
+    {u"data": None, u"other": 1},
+    {u"": None},
+    {u"-data": None},
+    {u"da+ta": None},
+    {u"data-": None},
+    {u"data": {u"type": u"x", u"id": u"1", u"attributes": {u"a\n": 1}}},
+    {u"data": {u"type": u"x", u"id": u"1", u"attributes": {u"\xe4☃": 1}}},
+    {u"data": [{u"type": u"x", u"id": u"1", u"attributes": {u"id": 1}}]},
+    {u"data": [{u"type": u"x"}]},
+    {u"data": [{u"type": u"x", u"id": u"1", u"other": 1}]},
+    {u"data": {u"type": u"x", u"id": u"1", u"relationships": {u"a": {}}}},
+    {u"data": {u"type": u"x", u"id": u"1", u"relationships": {
+        u"a": {u"data": {u"type": u"y"}}
+    }}},
+    {u"data": {u"type": u"x", u"id": u"1", u"relationships": {
+        u"a": {u"data": [{u"type": u"y", u"id": u"1", u"x": 1}]}
+    }}},
+    {u"data": None, u"links": {u"self": {u"href": u"/", u"x": 1}}},
+    {u"data": None, u"jsonapi": {u"other": 1}},
+    {u"included": []},
+]
+
+
+def bulk_payload(resources):
+    """A list of resources like in a bulk create request."""
+
+    return {
+        u"data": [{
+            u"type": u"article",
+            u"attributes": {
+                u"title": u"Article {}".format(i),
+                u"created-at": u"2016-01-01 00:00:00",
+                u"word count": i
+            },
+            u"relationships": {
+                u"author": {u"data": {u"type": u"person", u"id": u"1"}},
+                u"comments": {u"data": [
+                    {u"type": u"comment", u"id": unicode(j)}
+                    for j in xrange(3)
+                ]}
+            }
+        } for i in xrange(resources)]
+    }
+
+
+def nested_payload(resources):
+    """A single resource with many nested members, whose names are all
+    validated.
+    """
+
+    return {
+        u"data": {
+            u"type": u"article",
+            u"attributes": {
+                u"title": u"Article",
+                u"metrics": dict(
+                    (u"metric-{}".format(i), {u"value": i, u"unit": u"s"})
+                    for i in xrange(resources)
+                )
+            }
+        }
+    }
+
+
+def error(validator, doc):
+    try:
+        validator.validate_jsonapi(doc, True)
+    except Exception as e:
+        return e.__class__, str(e)
+
+
+def main(resources):
+    for doc in DOCUMENTS:
+        assert error(JsonAPIValidator, doc) == error(LegacyValidator, doc), doc
+
+    bulk = bulk_payload(resources)
+    nested = nested_payload(resources)
+
+    print "{:<10} {:>10} {:>10}".format("validator", "bulk", "nested")
+
+    for name, validator in [
+        ("legacy", LegacyValidator),
+        ("current", JsonAPIValidator)
+    ]:
+        assert error(validator, bulk) is None
+        assert error(validator, nested) is None
+
+        print "{:<10} {:>9.2f}ms {:>9.2f}ms".format(
+            name,
+            timeit.timeit(
+                lambda: validator.validate_jsonapi(bulk, True),
+                number=5
+            ) * 200,
+            timeit.timeit(
+                lambda: validator.validate_jsonapi(nested, True),
+                number=5
+            ) * 200
+        )
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
@@ -1,8 +1,18 @@
 # coding: utf-8
 
-from bottle import Bottle
+import threading
+from contextlib import contextmanager
+
+from bottle import Bottle, abort
 from peewee import ForeignKeyField
+from playhouse.pool import MaxConnectionsExceeded
+from corkscrew.cache import ResourceCache
+from corkscrew.connections import ConnectionTimeout, ClosingIterator
+from corkscrew.encoders import JsonEncoder
 from corkscrew.handlers import fn_error
+from corkscrew.handlers.operations import operations
+from corkscrew.handlers.schema import RequestSchema
+from corkscrew.handlers.serializer import Serializer
 from corkscrew.handlers.util import Link
 
 
@@ -12,6 +22,89 @@ class CorkscrewApplicationContext(object):
         self.app = app
         self.endpoints = {}
         self.factories = {}
+        self.serializers = {}
+        self.schemas = {}
+        self.local = threading.local()
+        self.lock = threading.Lock()
+
+    @property
+    def encoder(self):
+        return self.app.encoder
+
+    @property
+    def cache(self):
+        return self.app.cache
+
+    @property
+    def counts(self):
+        """The cache for the total counts of collections, which is the cache
+        of the application or a cache of this process if it has none. It is
+        None until the first count if the application has no cache.
+        """
+
+        return self.app.cache if self.app.cache is not None else (
+            self.app.counts
+        )
+
+    def count_cache(self):
+        """Returns the cache for the total counts of collections and creates
+        the cache of this process on first use if the application has none.
+        """
+
+        if self.counts is None:
+            with self.lock:
+                if self.app.counts is None:
+                    self.app.counts = ResourceCache()
+
+        return self.counts
+
+    def invalidate(self, *tags):
+        """Invalidates the cached documents and counts with one of the given
+        tags, or remembers them until deferred_invalidation() ends.
+        """
+
+        deferred = getattr(self.local, "deferred", None)
+
+        if deferred is not None:
+            deferred.extend(tags)
+
+        elif self.counts is not None:
+            self.counts.invalidate(*tags)
+
+    @contextmanager
+    def deferred_invalidation(self):
+        """Collects the invalidations of the current thread and applies them
+        when the block is left, which should be after the transaction that
+        wrote the resources has been committed. Otherwise documents rendered
+        from the old state in the meantime would stay cached. Nested blocks
+        leave the invalidations to the outermost one.
+        """
+
+        if getattr(self.local, "deferred", None) is not None:
+            yield
+            return
+
+        self.local.deferred = []
+
+        try:
+            yield
+
+        finally:
+            tags, self.local.deferred = self.local.deferred, None
+
+            if tags and self.counts is not None:
+                self.counts.invalidate(*tags)
+
+    def get_factory_by_type(self, _type):
+        """Returns the factory of the registered model with the given type
+        name or None.
+        """
+
+        for model, factory in self.factories.iteritems():
+            if model._meta.name == _type:
+                return factory
+
+        return None
 
     def get_factory(self, model):
         return self.factories[model] if model in self.factories else None
@@ -25,26 +118,106 @@ class CorkscrewApplicationContext(object):
             except KeyError:
                 return None
 
+    def get_serializer(self, model):
+        """Returns the compiled serializer for model. Models that are not
+        registered themselves are compiled on first use.
+        """
+
+        if model not in self.serializers:
+            self.serializers[model] = Serializer(model, self)
+
+        return self.serializers[model]
+
+    def get_schema(self, model):
+        """Returns the compiled request schema for model."""
+
+        if model not in self.schemas:
+            self.schemas[model] = RequestSchema(model, self)
+
+        return self.schemas[model]
+
     def add_factory(self, factory, endpoint):
         self.factories[factory.model] = factory
         self.endpoints[factory] = endpoint
+        self.serializers[factory.model] = Serializer(factory.model, self)
+        self.schemas[factory.model] = RequestSchema(factory.model, self)
 
 
 class CorkscrewApplication(Bottle):
 
-    def __init__(self, handler_factory):
+    def __init__(self, handler_factory, encoder=None, cache=None,
+                 connections=None):
+        """Return a new application.
+
+        Keyword arguments:
+        encoder -- the JSON encoder, corkscrew.encoders.JsonEncoder by default
+        cache -- a corkscrew.cache.ResourceCache for the resources of
+                 factories that were registered with cached=True
+        connections -- a corkscrew.connections.ConnectionManager that opens
+                       a database connection for each request and returns it
+                       to its pool once the response has been sent
+        """
+
         super(CorkscrewApplication, self).__init__()
 
         self.handler_factory = handler_factory
+        self.encoder = encoder or JsonEncoder()
+        self.cache = cache
+        self.counts = None
+        self.connections = connections
         self.context = CorkscrewApplicationContext(self)
 
         # setup default error handling
         self.error_handler = {x: fn_error for x in xrange(400, 601)}
 
-    def register(self, model, related=None, endpoint=None, listener=None):
+        if connections is not None:
+            self.add_hook("before_request", self.__checkout)
+
+    def __checkout(self):
+        try:
+            self.connections.checkout()
+        except (ConnectionTimeout, MaxConnectionsExceeded) as e:
+            abort(503, str(e))
+
+    def wsgi(self, environ, start_response):
+        if self.connections is None:
+            return super(CorkscrewApplication, self).wsgi(
+                environ,
+                start_response
+            )
+
+        try:
+            body = super(CorkscrewApplication, self).wsgi(
+                environ,
+                start_response
+            )
+
+        except:
+            self.connections.release()
+            raise
+
+        # streamed responses still read from the database
+        return ClosingIterator(body, self.connections.release)
+
+    def register(self, model, related=None, endpoint=None, listener=None,
+                 page_size=None, max_page_size=None, streaming=False,
+                 filterable=None, sortable=None, version_field=None,
+                 cached=False, total=None):
         endpoint = endpoint or "/" + model._meta.name
         related = related or {}
-        factory = self.handler_factory(model, related, listener)
+        factory = self.handler_factory(
+            model,
+            related,
+            listener,
+            page_size=page_size,
+            max_page_size=max_page_size,
+            streaming=streaming,
+            filterable=filterable,
+            sortable=sortable,
+            version_field=version_field,
+            cached=cached,
+            total=total
+        )
 
         self.context.add_factory(factory, endpoint)
         factory.context = self.context
@@ -59,6 +232,10 @@ class CorkscrewApplication(Bottle):
             ["DELETE", "OPTIONS"]
         )(factory.delete())
 
+        # bulk extension
+        self.route(endpoint, ["PATCH", "OPTIONS"])(factory.bulk_patch())
+        self.route(endpoint, ["DELETE", "OPTIONS"])(factory.bulk_delete())
+
         # add forward relationships to single resources (1:1, n:1)
         for f in factory.model._meta.sorted_fields:
             if isinstance(f, ForeignKeyField):
@@ -71,6 +248,13 @@ class CorkscrewApplication(Bottle):
 
             self.register_reverse_relation(factory, name, endpoint, target)
 
+    def register_operations(self, endpoint="/operations"):
+        """Adds an endpoint that applies a list of operations on the
+        registered resources in one transaction (atomic extension).
+        """
+
+        self.route(endpoint, ["POST", "OPTIONS"])(operations(self.context))
+
     def register_relation(self, factory, name, endpoint):
         ep = "{}/<_id>/{}".format(endpoint, name)
         self.route(ep, ["GET", "OPTIONS"])(factory.get_relationship(name))
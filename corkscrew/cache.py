@@ -0,0 +1,469 @@
+# coding: utf-8
+
+import json
+import math
+import time
+import sqlite3
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+
+DEFAULT_CACHE_SIZE = 1000
+DEFAULT_CACHE_TTL = 60
+
+
+class CacheBackend(object):
+    """The storage of a ResourceCache.
+
+    A backend stores entries (lists of JSON compatible values) by string keys
+    for a limited time and remembers when each tag was invalidated last.
+    Backends that are shared by several processes broadcast invalidations to
+    all of them this way.
+
+    Invalidations are compared with the times at which entries were rendered,
+    which are taken from the clock of each process. A shared backend must
+    therefore only be used by the processes of one host, otherwise the clock
+    skew between hosts can keep stale entries alive.
+    """
+
+    # the number of entries that were dropped to make room for others
+    evictions = 0
+
+    def get(self, key):
+        """Returns the entry stored for key or None."""
+
+        raise NotImplementedError
+
+    def set(self, key, entry, ttl):
+        """Stores entry for key for ttl seconds."""
+
+        raise NotImplementedError
+
+    def invalidated(self, tags):
+        """Returns the latest time one of tags was invalidated or None if
+        none of them was invalidated yet.
+        """
+
+        raise NotImplementedError
+
+    def invalidate(self, tags, when, ttl):
+        """Records that tags were invalidated at the time when. The record is
+        only needed for ttl seconds, after which all entries that were
+        rendered before when have expired.
+        """
+
+        raise NotImplementedError
+
+    def clear(self):
+        """Removes all entries."""
+
+        raise NotImplementedError
+
+    def size(self):
+        """Returns the number of entries or None if it is not known."""
+
+        return None
+
+
+class MemoryBackend(CacheBackend):
+    """Keeps the entries in a least recently used dictionary of the current
+    process. This is the default backend and a stand-in for the shared ones
+    in development and tests.
+    """
+
+    def __init__(self, max_size=DEFAULT_CACHE_SIZE, clock=time.time):
+        self.max_size = max_size
+        self.clock = clock
+
+        self.entries = OrderedDict()
+        # tag -> (invalidated, expires) in the order of invalidation
+        self.invalidations = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            item = self.entries.pop(key, None)
+
+            if item is None or item[1] <= self.clock():
+                return None
+
+            # move the entry to the end of the LRU order
+            self.entries[key] = item
+            return item[0]
+
+    def set(self, key, entry, ttl):
+        with self.lock:
+            self.entries.pop(key, None)
+
+            while len(self.entries) >= self.max_size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+            self.entries[key] = (entry, self.clock() + ttl)
+
+    def invalidated(self, tags):
+        with self.lock:
+            times = [
+                self.invalidations[tag][0] for tag in tags
+                if tag in self.invalidations
+            ]
+
+        return max(times) if times else None
+
+    def invalidate(self, tags, when, ttl):
+        with self.lock:
+            for tag in tags:
+                self.invalidations.pop(tag, None)
+                self.invalidations[tag] = (when, when + ttl)
+
+            # drop the records that no entry depends on anymore
+            now = self.clock()
+            while self.invalidations:
+                tag, (_, expires) = next(self.invalidations.iteritems())
+                if expires > now:
+                    break
+
+                del self.invalidations[tag]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def size(self):
+        return len(self.entries)
+
+
+class SqliteBackend(CacheBackend):
+    """Keeps the entries in an SQLite database file, so that all processes on
+    a host that open the same file share one cache.
+    """
+
+    def __init__(self, path, max_size=DEFAULT_CACHE_SIZE, clock=time.time):
+        self.path = path
+        self.max_size = max_size
+        self.clock = clock
+
+        self.local = threading.local()
+
+        # access times of hits that are written with the next set()
+        self.accessed = {}
+        self.lock = threading.Lock()
+
+        self.execute(
+            "CREATE TABLE IF NOT EXISTS corkscrew_entries ("
+            "key TEXT PRIMARY KEY, entry TEXT, expires REAL, accessed REAL)"
+        )
+        self.execute(
+            "CREATE TABLE IF NOT EXISTS corkscrew_invalidations ("
+            "tag TEXT PRIMARY KEY, invalidated REAL)"
+        )
+
+    def __connection(self):
+        # connections must neither be shared by threads nor survive a fork
+        pid = os.getpid()
+
+        if getattr(self.local, "pid", None) != pid:
+            self.local.connection = sqlite3.connect(
+                self.path,
+                timeout=30,
+                isolation_level=None
+            )
+            self.local.connection.execute("PRAGMA journal_mode=WAL")
+            self.local.pid = pid
+
+        return self.local.connection
+
+    def execute(self, sql, params=()):
+        return self.__connection().execute(sql, params).fetchall()
+
+    def executemany(self, sql, params):
+        self.__connection().executemany(sql, params)
+
+    def get(self, key):
+        now = self.clock()
+        rows = self.execute(
+            "SELECT entry FROM corkscrew_entries "
+            "WHERE key = ? AND expires > ?",
+            (key, now)
+        )
+
+        if not rows:
+            return None
+
+        # a hit does not write, the LRU order is updated by the next set()
+        with self.lock:
+            self.accessed[key] = now
+
+        return json.loads(rows[0][0])
+
+    def set(self, key, entry, ttl):
+        now = self.clock()
+
+        with self.lock:
+            accessed, self.accessed = self.accessed, {}
+
+        if accessed:
+            self.executemany(
+                "UPDATE corkscrew_entries SET accessed = ? WHERE key = ?",
+                [(when, key) for key, when in accessed.iteritems()]
+            )
+
+        self.execute(
+            "DELETE FROM corkscrew_entries WHERE expires <= ?",
+            (now,)
+        )
+
+        overflow = self.execute(
+            "SELECT COUNT(*) FROM corkscrew_entries WHERE key != ?",
+            (key,)
+        )[0][0] - self.max_size + 1
+
+        if overflow > 0:
+            self.execute(
+                "DELETE FROM corkscrew_entries WHERE key IN ("
+                "SELECT key FROM corkscrew_entries WHERE key != ? "
+                "ORDER BY accessed LIMIT ?)",
+                (key, overflow)
+            )
+            self.evictions += overflow
+
+        self.execute(
+            "INSERT OR REPLACE INTO corkscrew_entries "
+            "(key, entry, expires, accessed) VALUES (?, ?, ?, ?)",
+            (key, json.dumps(entry), now + ttl, now)
+        )
+
+    def invalidated(self, tags):
+        if not tags:
+            return None
+
+        rows = self.execute(
+            "SELECT MAX(invalidated) FROM corkscrew_invalidations "
+            "WHERE tag IN ({})".format(", ".join("?" * len(tags))),
+            tags
+        )
+
+        return rows[0][0]
+
+    def invalidate(self, tags, when, ttl):
+        self.execute(
+            "DELETE FROM corkscrew_invalidations WHERE invalidated <= ?",
+            (self.clock() - ttl,)
+        )
+        self.executemany(
+            "INSERT OR REPLACE INTO corkscrew_invalidations "
+            "(tag, invalidated) VALUES (?, ?)",
+            [(tag, when) for tag in tags]
+        )
+
+    def clear(self):
+        self.execute("DELETE FROM corkscrew_entries")
+
+    def size(self):
+        return self.execute("SELECT COUNT(*) FROM corkscrew_entries")[0][0]
+
+
+class MemcachedBackend(CacheBackend):
+    """Adapts a memcached or redis client that is shared by the processes of
+    one host. Any client with get(key) and set(key, value, ttl) methods
+    works, like those of python-memcached, pylibmc, pymemcache and redis-py.
+    The invalidations of several tags are read with one get_multi(keys) or
+    mget(keys) call if the client has one of them.
+
+    Invalidations expire after the ttl of the entries, but the server may
+    evict them earlier under memory pressure. Entries expire after their ttl
+    at the latest, which bounds how long such an eviction can cause stale
+    reads.
+    """
+
+    def __init__(self, client, prefix="corkscrew:"):
+        self.client = client
+        self.prefix = prefix
+
+    def __key(self, kind, key):
+        # memcached does not allow arbitrary characters in keys
+        if isinstance(key, unicode):
+            key = key.encode("utf-8")
+
+        return "{}{}:{}".format(
+            self.prefix,
+            kind,
+            hashlib.sha1(key).hexdigest()
+        )
+
+    def get(self, key):
+        value = self.client.get(self.__key("entry", key))
+        return json.loads(value) if value is not None else None
+
+    @staticmethod
+    def __expiration(ttl):
+        # whole seconds, 0 would never expire
+        return max(1, int(math.ceil(ttl)))
+
+    def set(self, key, entry, ttl):
+        self.client.set(
+            self.__key("entry", key),
+            json.dumps(entry),
+            self.__expiration(ttl)
+        )
+
+    def invalidated(self, tags):
+        keys = [self.__key("tag", tag) for tag in tags]
+
+        if not keys:
+            return None
+
+        if hasattr(self.client, "get_multi"):
+            values = self.client.get_multi(keys).values()
+        elif hasattr(self.client, "mget"):
+            values = self.client.mget(keys)
+        else:
+            values = [self.client.get(key) for key in keys]
+
+        times = [float(value) for value in values if value is not None]
+        return max(times) if times else None
+
+    def invalidate(self, tags, when, ttl):
+        # entries are rounded up to whole seconds as well
+        ttl = self.__expiration(ttl) + 1
+
+        for tag in tags:
+            self.client.set(self.__key("tag", tag), repr(when), ttl)
+
+    def clear(self):
+        # entries of a shared server are left to expire
+        pass
+
+
+class ResourceCache(object):
+    """A cache for encoded documents with a time to live.
+
+    Every entry is stored with a set of tags, usually the (type, id) pairs of
+    the resources in the document. Invalidating a tag records the current
+    time, which turns all entries with that tag that were rendered before
+    into misses. This way an entry can be invalidated without knowing its key.
+    Entries expire ttl seconds after rendering started, so that the records
+    of invalidations can be dropped after ttl seconds as well.
+
+    The entries are kept by a CacheBackend, a MemoryBackend with a least
+    recently used eviction policy if none is given.
+    """
+
+    def __init__(self, max_size=DEFAULT_CACHE_SIZE, ttl=DEFAULT_CACHE_TTL,
+                 clock=time.time, backend=None):
+        """Return a new cache.
+
+        Keyword arguments:
+        max_size -- the number of entries of the default backend, the least
+                    recently used entry is evicted if a new entry does not fit
+                    anymore
+        ttl -- the number of seconds an entry is valid for
+        clock -- a function that returns the current time in seconds
+        backend -- a CacheBackend, like a SqliteBackend that is shared by all
+                   worker processes of a host
+        """
+
+        self.ttl = ttl
+        self.clock = clock
+        self.backend = backend or MemoryBackend(max_size, clock)
+
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def __key(key):
+        return hashlib.sha1(json.dumps(key)).hexdigest()
+
+    @staticmethod
+    def __tag(tag):
+        return u":".join(tag)
+
+    def now(self):
+        """Returns the current time of the cache's clock."""
+
+        return self.clock()
+
+    def get(self, key):
+        """Returns the value stored for key or None."""
+
+        entry = self.backend.get(self.__key(key))
+
+        if entry is not None:
+            value, tags, rendered = entry
+            invalidated = self.backend.invalidated(tags)
+
+            if invalidated is None or invalidated < rendered:
+                self.hits += 1
+                return value
+
+        self.misses += 1
+        return None
+
+    def set(self, key, value, tags=(), since=None):
+        """Stores value for key, tagged with the given tags.
+
+        Keyword arguments:
+        since -- the time at which rendering value started, invalidations
+                 after it make the entry stale right away
+        """
+
+        now = self.clock()
+        rendered = now if since is None else since
+        ttl = rendered + self.ttl - now
+
+        if ttl <= 0:
+            return
+
+        tags = sorted(set(self.__tag(tag) for tag in tags))
+        self.backend.set(self.__key(key), [value, tags, rendered], ttl)
+
+    def invalidate(self, *tags):
+        """Invalidates all entries that were stored with one of tags."""
+
+        self.backend.invalidate(
+            [self.__tag(tag) for tag in tags],
+            self.clock(),
+            self.ttl
+        )
+
+    def clear(self):
+        """Removes all entries."""
+
+        self.backend.clear()
+
+    def stats(self):
+        """Returns the hit, miss and eviction counters and the size."""
+
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.backend.evictions,
+            "size": self.backend.size()
+        }
+
+    @property
+    def evictions(self):
+        return self.backend.evictions
+
+
+def resource_tag(type_, key):
+    """The tag of documents that contain the resource with the given key."""
+
+    return (type_, unicode(key))
+
+
+def type_tag(type_):
+    """The tag of documents that contain any resource of the given type."""
+
+    return (type_, "*")
+
+
+def membership_tag(type_):
+    """The tag of documents that contain a to-many relationship with
+    resources of the given type. They change whenever such a resource is
+    created, deleted or assigned to another parent.
+    """
+
+    return (type_, "+")
@@ -0,0 +1,189 @@
+# coding: utf-8
+
+import time
+import threading
+
+from playhouse.pool import PooledDatabase
+
+from corkscrew.handlers.util import get_database
+
+
+# the number of seconds a request waits for a connection by default
+DEFAULT_TIMEOUT = 30
+
+
+class ConnectionTimeout(Exception):
+    """Raised if no connection became available in time."""
+
+
+class ConnectionManager(object):
+    """Checks out a database connection for each request and returns it once
+    the response has been sent, including streamed responses.
+
+    With a pooled database from playhouse.pool returning a connection puts
+    it back into the pool, other databases close it. At most max_connections
+    requests hold a connection at the same time, the others wait for one to
+    be returned and fail after timeout seconds.
+    """
+
+    def __init__(self, database, max_connections=None, stale_timeout=None,
+                 timeout=DEFAULT_TIMEOUT):
+        """Return a new connection manager.
+
+        Keyword arguments:
+        database -- a peewee database or a peewee.Proxy that is initialized
+                    before the first request
+        max_connections -- the number of connections that are used at the
+                           same time, the max_connections of a pooled
+                           database by default
+        stale_timeout -- the number of seconds after which a pooled
+                         connection is closed instead of being reused
+        timeout -- the number of seconds a request waits for a connection
+                   or None to wait indefinitely
+        """
+
+        self.database = database
+        self.max_connections = max_connections
+        self.stale_timeout = stale_timeout
+        self.timeout = timeout
+
+        self.condition = threading.Condition()
+        self.local = threading.local()
+        self.configured = None
+
+        self.in_use = 0
+        self.checkouts = 0
+        self.waits = 0
+        self.wait_time = 0.0
+        self.max_wait = 0.0
+        self.timeouts = 0
+
+    def __database(self):
+        database = get_database(self.database)
+
+        if self.configured is not database and isinstance(
+            database,
+            PooledDatabase
+        ):
+            # the pool must not refuse connections that were granted here
+            if self.max_connections is None:
+                self.max_connections = database.max_connections
+            else:
+                database.max_connections = self.max_connections
+
+            if self.stale_timeout is not None:
+                database.stale_timeout = self.stale_timeout
+
+        self.configured = database
+        return database
+
+    def checkout(self):
+        """Opens a connection for the current thread, waiting for one to be
+        returned by another thread if max_connections are in use.
+        """
+
+        if getattr(self.local, "checked_out", False):
+            return
+
+        database = self.__database()
+        start = time.time()
+
+        with self.condition:
+            blocked = False
+
+            while self.max_connections and (
+                self.in_use >= self.max_connections
+            ):
+                remaining = None
+
+                if self.timeout is not None:
+                    remaining = start + self.timeout - time.time()
+
+                    if remaining <= 0:
+                        self.timeouts += 1
+                        raise ConnectionTimeout(
+                            "No database connection became available."
+                        )
+
+                blocked = True
+                self.condition.wait(remaining)
+
+            waited = time.time() - start
+
+            self.in_use += 1
+            self.checkouts += 1
+            self.waits += blocked
+            self.wait_time += waited
+            self.max_wait = max(self.max_wait, waited)
+
+        self.local.checked_out = True
+
+        try:
+            if database.is_closed():
+                database.connect()
+
+        except:
+            self.release()
+            raise
+
+    def release(self):
+        """Returns the connection of the current thread."""
+
+        if not getattr(self.local, "checked_out", False):
+            return
+
+        self.local.checked_out = False
+
+        try:
+            database = self.__database()
+
+            if not database.is_closed():
+                database.close()
+
+        finally:
+            with self.condition:
+                self.in_use -= 1
+                self.condition.notify()
+
+    def stats(self):
+        """Returns the checkout, wait and timeout counters, the number of
+        connections in use and, for pooled databases, the number of idle
+        connections in the pool.
+        """
+
+        database = self.__database()
+        idle = None
+
+        if isinstance(database, PooledDatabase):
+            idle = len(database._connections)
+
+        return {
+            "checkouts": self.checkouts,
+            "in_use": self.in_use,
+            "idle": idle,
+            "waits": self.waits,
+            "wait_time": self.wait_time,
+            "max_wait": self.max_wait,
+            "timeouts": self.timeouts
+        }
+
+
+class ClosingIterator(object):
+    """Wraps a WSGI response body and calls callback when the server closes
+    it after the body has been sent.
+    """
+
+    def __init__(self, body, callback):
+        self.body = body
+        self.callback = callback
+
+    def __iter__(self):
+        return iter(self.body)
+
+    def close(self):
+        try:
+            if hasattr(self.body, "close"):
+                self.body.close()
+
+        finally:
+            self.callback()
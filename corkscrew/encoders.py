@@ -0,0 +1,102 @@
+# coding: utf-8
+
+import json
+
+
+class JsonEncoder(object):
+    """Encodes and decodes documents with the json module of the standard
+    library.
+
+    Subclasses wrap faster third party implementations. All of them raise a
+    ValueError (or a subclass of it) for documents that cannot be decoded.
+    """
+
+    name = "json"
+
+    def __init__(self, sort_keys=True):
+        """Return a new encoder.
+
+        Keyword arguments:
+        sort_keys -- output the members of objects sorted by their names,
+                     disabling this saves a considerable amount of time
+        """
+
+        self.sort_keys = sort_keys
+
+    def dumps(self, doc):
+        return json.dumps(doc, sort_keys=self.sort_keys)
+
+    def loads(self, s):
+        return json.loads(s)
+
+
+class SimpleJsonEncoder(JsonEncoder):
+    """Uses the simplejson module with its C speedups."""
+
+    name = "simplejson"
+
+    def __init__(self, sort_keys=True):
+        import simplejson
+        self.simplejson = simplejson
+
+        super(SimpleJsonEncoder, self).__init__(sort_keys)
+
+    def dumps(self, doc):
+        return self.simplejson.dumps(doc, sort_keys=self.sort_keys)
+
+    def loads(self, s):
+        if isinstance(s, str):
+            # simplejson returns str for ASCII-only strings of a str input
+            s = s.decode("utf-8")
+
+        return self.simplejson.loads(s)
+
+
+class UJsonEncoder(JsonEncoder):
+    """Uses the ujson module."""
+
+    name = "ujson"
+
+    def __init__(self, sort_keys=True):
+        import ujson
+        self.ujson = ujson
+
+        super(UJsonEncoder, self).__init__(sort_keys)
+
+    def dumps(self, doc):
+        return self.ujson.dumps(doc, sort_keys=self.sort_keys)
+
+    def loads(self, s):
+        return self.ujson.loads(s)
+
+
+ENCODERS = [UJsonEncoder, SimpleJsonEncoder, JsonEncoder]
+
+
+def available_encoders():
+    """Returns the encoder classes whose backend can be imported, the
+    fastest first.
+    """
+
+    encoders = []
+    for encoder in ENCODERS:
+        try:
+            encoder()
+        except ImportError:
+            continue
+
+        encoders.append(encoder)
+
+    return encoders
+
+
+def get_encoder(name=None, sort_keys=True):
+    """Returns an encoder instance for the backend with the given name, or
+    the fastest available backend if no name is given.
+    """
+
+    for encoder in available_encoders():
+        if name is None or encoder.name == name:
+            return encoder(sort_keys=sort_keys)
+
+    raise ImportError("The JSON backend '{}' is not available.".format(name))
@@ -0,0 +1,193 @@
+# coding: utf-8
+
+from peewee import MySQLDatabase, SqliteDatabase, PrimaryKeyField
+from playhouse.shortcuts import case
+
+from corkscrew.handlers.util import MAX_PARAMETERS, key_batches, get_database
+
+
+# the number of rows that are inserted with one statement
+BULK_BATCH_SIZE = 100
+
+
+def batches(rows, size=BULK_BATCH_SIZE):
+    """Splits rows (dictionaries of field names to values) into lists of rows
+    that can be inserted with one statement: they have the same keys and
+    stay below size rows and MAX_PARAMETERS values.
+    """
+
+    batch = []
+    for row in rows:
+        if batch and (
+            set(row) != set(batch[0])
+            or len(batch) >= size
+            or (len(batch) + 1) * len(row) > MAX_PARAMETERS
+        ):
+            yield batch
+            batch = []
+
+        batch.append(row)
+
+    if batch:
+        yield batch
+
+
+def insert_rows(model, rows, size=BULK_BATCH_SIZE):
+    """Inserts rows with multi-row INSERT statements and returns their primary
+    keys in the same order. This should be called inside a transaction.
+
+    Primary keys that were not given are read from a RETURNING clause where
+    the database supports it. SQLite assigns an auto-incrementing key
+    consecutively within one statement, so the keys are derived from the last
+    insert id there. Other databases (like MySQL with interleaved
+    auto-increment locks) give no such guarantee, their rows are inserted one
+    by one.
+    """
+
+    meta = model._meta
+    primary_key = meta.primary_key.name
+    database = get_database(model)
+
+    keys = []
+
+    for batch in batches(rows, size):
+        if primary_key in batch[0]:
+            # client generated ids
+            model.insert_many(batch).execute()
+            keys += [row[primary_key] for row in batch]
+
+        elif database.insert_returning:
+            keys += model.insert_many(batch).return_id_list().execute()
+
+        elif isinstance(database, SqliteDatabase) and isinstance(
+            meta.primary_key,
+            PrimaryKeyField
+        ):
+            cursor = database.execute_sql(*model.insert_many(batch).sql())
+
+            # the id of the last row
+            first = database.last_insert_id(cursor, model) - len(batch) + 1
+            keys += range(first, first + len(batch))
+
+        else:
+            keys += [model.insert(**row).execute() for row in batch]
+
+    return keys
+
+
+def update_rows(model, rows, **values):
+    """Updates rows, a list of (primary key, {field name: value}) tuples, with
+    one UPDATE statement per batch whose values are picked by a CASE on the
+    primary key. The given values (or expressions) are set on all rows
+    unless a row has its own. This should be called inside a transaction.
+    """
+
+    primary_key = model._meta.primary_key
+
+    batch = []
+    names = set()
+
+    for key, row in rows:
+        columns = len(names | set(row))
+
+        # two parameters per value and column plus the key in WHERE ... IN
+        if batch and (
+            len(batch) >= BULK_BATCH_SIZE
+            or (len(batch) + 1) * (2 * columns + 1) + len(values)
+            > MAX_PARAMETERS
+        ):
+            _update_batch(model, batch, names, values)
+            batch = []
+            names = set()
+
+        batch.append((primary_key.db_value(key), row))
+        names.update(row)
+
+    if batch:
+        _update_batch(model, batch, names, values)
+
+
+def _update_batch(model, batch, names, values):
+    fields = model._meta.fields
+    primary_key = model._meta.primary_key
+    updates = dict(
+        (name, value) for name, value in values.iteritems()
+        if name not in names
+    )
+
+    for name in names:
+        field = fields[name]
+        whens = [
+            (key, field.db_value(row[name]))
+            for key, row in batch if name in row
+        ]
+
+        if len(whens) == len(batch) and len(set(v for _, v in whens)) == 1:
+            # the same value for all rows
+            updates[name] = whens[0][1]
+        else:
+            updates[name] = case(primary_key, whens, field)
+
+    if updates:
+        model.update(**updates).where(
+            primary_key << [key for key, _ in batch]
+        ).execute()
+
+
+def update_row(model, key, values):
+    """Updates the given fields of the row with the primary key key and
+    returns True if it exists.
+    """
+
+    primary_key = model._meta.primary_key
+
+    if model.update(**values).where(primary_key == key).execute():
+        return True
+
+    # MySQL reports the number of changed rather than matched rows
+    return isinstance(get_database(model), MySQLDatabase) and bool(
+        existing_keys(model, [key])
+    )
+
+
+def update_keys(model, keys, **values):
+    """Sets the same values on the rows with the given primary keys in
+    batches and returns the number of updated rows. This should be called
+    inside a transaction.
+    """
+
+    primary_key = model._meta.primary_key
+
+    return sum(
+        model.update(**values).where(primary_key << batch).execute()
+        for batch in key_batches(keys)
+    )
+
+
+def delete_rows(model, keys):
+    """Deletes the rows with the given primary keys in batches and returns
+    the number of deleted rows. This should be called inside a transaction.
+    """
+
+    primary_key = model._meta.primary_key
+
+    return sum(
+        model.delete().where(primary_key << batch).execute()
+        for batch in key_batches(keys)
+    )
+
+
+def existing_keys(model, keys):
+    """Returns the set of the given primary keys that exist."""
+
+    primary_key = model._meta.primary_key
+    existing = set()
+
+    for batch in key_batches(keys):
+        existing.update(
+            key for key, in model.select(primary_key).where(
+                primary_key << batch
+            ).tuples()
+        )
+
+    return existing
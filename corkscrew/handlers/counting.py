@@ -0,0 +1,98 @@
+# coding: utf-8
+
+from peewee import MySQLDatabase, PostgresqlDatabase
+
+from corkscrew.cache import resource_tag, type_tag, membership_tag
+from corkscrew.handlers.util import get_database
+
+
+# tables with less rows than this are counted exactly in "estimated" mode
+ESTIMATE_THRESHOLD = 100000
+
+
+def estimate(model):
+    """Returns the number of rows of the model's table according to the
+    statistics of the database or None if they are not available.
+    """
+
+    database = get_database(model)
+
+    if isinstance(database, PostgresqlDatabase):
+        sql = "SELECT reltuples FROM pg_class WHERE relname = %s"
+
+    elif isinstance(database, MySQLDatabase):
+        sql = (
+            "SELECT table_rows FROM information_schema.tables "
+            "WHERE table_schema = DATABASE() AND table_name = %s"
+        )
+
+    else:
+        return None
+
+    row = database.execute_sql(sql, (model._meta.db_table,)).fetchone()
+
+    if row is None or row[0] is None:
+        return None
+
+    return int(row[0])
+
+
+class Counter(object):
+    """Counts the rows of queries on one model.
+
+    Counts are kept in a corkscrew.cache.ResourceCache by the SQL of the
+    query, so that each filter signature is counted once until a resource
+    of the model is written through one of the application's endpoints.
+    Without a cache every call counts.
+    """
+
+    def __init__(self, model, cache, estimated=False, parent=None):
+        """Return a new counter.
+
+        Keyword arguments:
+        estimated -- use the statistics of the database for the whole table
+                     if it has at least ESTIMATE_THRESHOLD rows, only
+                     meaningful for queries without conditions
+        parent -- the (type, id) pair of the resource whose relationship is
+                  counted, writes to it invalidate the count as well
+        """
+
+        self.model = model
+        self.cache = cache
+        self.estimated = estimated
+        self.parent = parent
+
+        # True if the last count is an estimate
+        self.is_estimate = False
+
+    def __call__(self, query):
+        if self.estimated:
+            rows = estimate(self.model)
+
+            if rows is not None and rows >= ESTIMATE_THRESHOLD:
+                self.is_estimate = True
+                return rows
+
+        self.is_estimate = False
+
+        if self.cache is None:
+            return query.count()
+
+        sql, params = query.sql()
+        key = ("count", sql) + tuple(unicode(param) for param in params)
+
+        total = self.cache.get(key)
+
+        if total is None:
+            since = self.cache.now()
+            total = query.count()
+
+            name = self.model._meta.name
+            tags = [type_tag(name), membership_tag(name)]
+
+            if self.parent:
+                tags.append(resource_tag(*self.parent))
+
+            self.cache.set(key, total, tags, since=since)
+
+        return total
@@ -5,7 +5,7 @@ import json
 import logging
 import traceback
 
-from bottle import abort, request, response
+from bottle import HTTPError, abort, request, response
 from peewee import IntegrityError
 from corkscrew.jsonapi import JsonAPIResponse, JsonAPIError, JsonAPIException
 from corkscrew.jsonapi import CONTENT_TYPE
@@ -35,6 +35,11 @@ def fn_error(error):
         doc = JsonAPIResponse(request.url)
         err = JsonAPIError(code=error.status, title=error.body)
         doc.errors.append(err)
+
+        encoder = getattr(request.app, "encoder", None)
+        if encoder:
+            return encoder.dumps(dict(doc))
+
         return json.dumps(dict(doc), sort_keys=True)
     except:
         logging.error("".join(traceback.format_exception(*sys.exc_info())))
@@ -64,6 +69,10 @@ def ErrorHandler(fn):
         try:
             return fn(*args, **kwargs)
 
+        except HTTPError:
+            # raised by a nested handler, e.g. when patching a relationship
+            raise
+
         except ValueError:
             logging.error("".join(traceback.format_exception(*sys.exc_info())))
             abort(400, "Could not parse request. Be sure to use valid JSON.")
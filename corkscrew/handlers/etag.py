@@ -0,0 +1,97 @@
+# coding: utf-8
+
+import datetime
+import hashlib
+
+from bottle import request, response
+from peewee import DateField, DateTimeField, TimeField
+
+
+def digest(*parts):
+    """Returns a strong entity tag for the given strings."""
+
+    sha = hashlib.sha1()
+    for part in parts:
+        if isinstance(part, unicode):
+            part = part.encode("utf-8")
+
+        sha.update(part)
+        sha.update("\0")
+
+    return '"{}"'.format(sha.hexdigest())
+
+
+def version_etag(serializer, entries, version_field, loader, fields, *extra):
+    """Returns an entity tag for the representation of entries that is
+    derived from their primary keys, the values of their version field and
+    the keys of the reverse relationships that are going to be serialized,
+    so that the entries do not need to be serialized to compute it.
+
+    The loader must have been primed with the reverse relationships of
+    entries already. Strings that the representation depends on as well
+    (like the request URL) are given as extra.
+    """
+
+    selected = fields.get(serializer.type)
+    parts = [serializer.type]
+
+    for entry in entries:
+        parts.append(unicode(entry._data.get(serializer.primary_key)))
+        parts.append(unicode(entry._data.get(version_field)))
+
+        for name, _, _, target_key in serializer.related:
+            if selected is not None and name not in selected:
+                continue
+
+            parts.append(u",".join(
+                unicode(child._data.get(target_key))
+                for child in loader.get_related(entry, name) or []
+            ))
+
+    return digest(*(parts + list(extra)))
+
+
+def next_version(field):
+    """Returns the value that an UPDATE assigns to the version field: the
+    current time for date and time fields, the current value plus one for
+    revision counters.
+    """
+
+    now = datetime.datetime.now()
+
+    if isinstance(field, DateTimeField):
+        return now
+
+    if isinstance(field, DateField):
+        return now.date()
+
+    if isinstance(field, TimeField):
+        return now.time()
+
+    return field + 1
+
+
+def not_modified(etag):
+    """Sets the ETag header of the response and returns True if the client
+    already has the representation with this entity tag, in which case the
+    response status is set to 304 Not Modified.
+    """
+
+    response.set_header("ETag", etag)
+
+    if request.method not in ("GET", "HEAD"):
+        return False
+
+    header = request.get_header("If-None-Match")
+    if not header:
+        return False
+
+    # If-None-Match uses the weak comparison function
+    tags = [tag.strip() for tag in header.split(",")]
+    tags = [tag[2:] if tag.startswith("W/") else tag for tag in tags]
+
+    if "*" in tags or etag in tags:
+        response.status = 304
+        return True
+
+    return False
@@ -0,0 +1,100 @@
+# coding: utf-8
+
+import re
+import operator
+
+from bottle import request
+
+from corkscrew.jsonapi import JsonAPIException
+
+
+FILTER_PARAMETER = re.compile(r"^filter\[([^\[\]]+)\](?:\[([^\[\]]+)\])?$")
+
+OPERATORS = {
+    "eq": operator.eq,
+    "ne": operator.ne,
+    "lt": operator.lt,
+    "lte": operator.le,
+    "gt": operator.gt,
+    "gte": operator.ge
+}
+
+
+class Filter(object):
+    """Translates the filter[...] query parameters of the current request
+    into a WHERE clause for a peewee query.
+
+    filter[name]=value -- name is equal to value
+    filter[name]=a,b -- name is one of a or b
+    filter[name][op]=value -- name compared to value, op is one of eq, ne,
+                              lt, lte, gt and gte (eq and ne accept lists)
+
+    Only the fields that were whitelisted with the filterable argument of
+    CorkscrewApplication.register() may be used.
+    """
+
+    def __init__(self, model, filterable=None):
+        self.model = model
+        self.conditions = []
+
+        fields = model._meta.fields
+        filterable = filterable or []
+
+        for param in sorted(request.query.keys()):
+            match = FILTER_PARAMETER.match(param)
+            if not match:
+                continue
+
+            name, op = match.group(1), match.group(2) or "eq"
+            value = request.query.get(param)
+
+            if name not in filterable or name not in fields:
+                raise JsonAPIException(
+                    "Filtering by '{}' is not allowed.".format(name),
+                    status=400
+                )
+
+            if op not in OPERATORS:
+                raise JsonAPIException(
+                    "Unknown filter operator '{}'.".format(op),
+                    status=400
+                )
+
+            # only eq and ne accept lists
+            values = value.split(",") if op in ("eq", "ne") else [value]
+
+            try:
+                values = [fields[name].db_value(v) for v in values]
+            except (TypeError, ValueError):
+                raise JsonAPIException(
+                    "The value of {} is not valid.".format(param),
+                    status=400
+                )
+
+            self.conditions.append((name, op, values))
+
+    def expressions(self):
+        """Returns the peewee expressions of all conditions."""
+
+        fields = self.model._meta.fields
+        expressions = []
+
+        for name, op, values in self.conditions:
+            field = fields[name]
+
+            if op == "eq" and len(values) > 1:
+                expressions.append(field << values)
+            elif op == "ne" and len(values) > 1:
+                expressions.append(field.not_in(values))
+            else:
+                expressions.append(OPERATORS[op](field, values[0]))
+
+        return expressions
+
+    def apply(self, query):
+        """Returns query restricted to rows that match all conditions."""
+
+        for expression in self.expressions():
+            query = query.where(expression)
+
+        return query
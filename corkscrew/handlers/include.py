@@ -0,0 +1,110 @@
+# coding: utf-8
+
+from collections import OrderedDict
+
+from peewee import ForeignKeyField
+
+from corkscrew.jsonapi import JsonAPIException
+from corkscrew.handlers.util import Link, get_primary_key
+
+
+class IncludeEdge(object):
+    """A single relationship that is followed by an include path."""
+
+    def __init__(self, name, target, field=None, link=None):
+        self.name = name
+        self.target = target
+        self.field = field
+        self.link = link
+        self.children = OrderedDict()
+
+
+class IncludePlan(object):
+    """Compiles the include parameter of a request into a tree of
+    relationships.
+
+    The tree is validated against the relationships that are registered with
+    the application before any query is issued. Executing the plan loads each
+    edge of the tree with a single query for all rows on that level.
+    """
+
+    def __init__(self, model, context, include):
+        self.model = model
+        self.context = context
+        self.edges = OrderedDict()
+
+        for path in include.split(","):
+            if path:
+                self.__add_path(path.split("."))
+
+    def __add_path(self, names):
+        if len(set(names)) != len(names):
+            raise JsonAPIException(
+                "Circular include field specification detected.",
+                status=400
+            )
+
+        model = self.model
+        edges = self.edges
+
+        for name in names:
+            if name not in edges:
+                edges[name] = self.__make_edge(model, name)
+
+            model = edges[name].target
+            edges = edges[name].children
+
+    def __make_edge(self, model, name):
+        field = model._meta.fields.get(name)
+
+        if isinstance(field, ForeignKeyField):
+            return IncludeEdge(name, field.rel_model, field=field)
+
+        factory = self.context.get_factory(model)
+        if factory and name in factory.related:
+            link = factory.related[name]
+
+            if not isinstance(link, Link):
+                link = Link(link)
+
+            return IncludeEdge(name, link.target, link=link)
+
+        raise JsonAPIException(
+            "Unknown field to be included: " + name,
+            status=400
+        )
+
+    def execute(self, entries, loader):
+        """Loads all rows that are to be included for the given primary rows
+        and returns them in the order they were discovered, without
+        duplicates.
+        """
+
+        included = OrderedDict()
+        self.__execute(entries, self.edges, loader, included)
+
+        return included.values()
+
+    def __execute(self, entries, edges, loader, included):
+        if not entries:
+            return
+
+        for edge in edges.itervalues():
+            if edge.field:
+                values = set(entry._data.get(edge.field.name)
+                             for entry in entries)
+                values.discard(None)
+
+                rows = loader.load(edge.field, values)
+
+            else:
+                rows = loader.load_related(entries, edge.name, edge.link)
+
+            unique = OrderedDict()
+            for row in rows:
+                unique[(row.__class__, get_primary_key(row))] = row
+
+            for key, row in unique.iteritems():
+                included.setdefault(key, row)
+
+            self.__execute(unique.values(), edge.children, loader, included)
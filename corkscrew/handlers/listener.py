@@ -8,6 +8,12 @@ class Listener(object):
     def after_create(self, response):
         pass
 
+    def after_bulk_create(self, created):
+        """Called once with all resources that a bulk request created."""
+
+        for entry in created:
+            self.after_create(entry)
+
     def before_list(self):
         pass
 
@@ -26,8 +32,40 @@ class Listener(object):
     def after_delete(self, _id):
         pass
 
+    def before_bulk_delete(self, keys):
+        """Called once with the primary keys of all resources that a bulk
+        request is going to delete.
+        """
+
+        for _id in keys:
+            self.before_delete(_id)
+
+    def after_bulk_delete(self, keys):
+        """Called once with the primary keys of all resources that a bulk
+        request deleted.
+        """
+
+        for _id in keys:
+            self.after_delete(_id)
+
     def before_patch(self, request):
         pass
 
     def after_patch(self, response):
         pass
+
+    def before_bulk_patch(self, request):
+        """Called once with the request document of a bulk request before
+        any resource is patched.
+        """
+
+        for resource in request["data"]:
+            self.before_patch({u"data": resource})
+
+    def after_bulk_patch(self, keys, response):
+        """Called once with the primary keys of all resources that a bulk
+        request patched. The resources are returned if this returns True,
+        which is the case if after_patch() does for one of them.
+        """
+
+        return any([self.after_patch(response) for _ in keys])
@@ -0,0 +1,162 @@
+# coding: utf-8
+
+from corkscrew.handlers.util import get_link_field, get_primary_key
+from corkscrew.handlers.util import key_batches
+
+
+# alias of the column that carries the parent key in n:m queries
+PARENT_KEY = "_corkscrew_parent"
+
+
+class Loader(object):
+    """A per-request identity map for peewee rows.
+
+    Instead of resolving relationships lazily (one SELECT per row and field),
+    the loader collects the keys of a whole result set and retrieves each
+    relationship with a single IN (...) query, split into batches that stay
+    below the parameter limit of the database. Rows that were loaded once are
+    reused for the rest of the request.
+    """
+
+    def __init__(self, context):
+        self.context = context
+        self.rows = {}
+        self.related = {}
+
+    def __key(self, model, field, value):
+        return (model, field.name, value)
+
+    def add(self, rows):
+        """Registers rows that were retrieved elsewhere with the loader."""
+
+        for row in rows:
+            meta = row.__class__._meta
+            key = self.__key(
+                row.__class__,
+                meta.primary_key,
+                getattr(row, meta.primary_key.name)
+            )
+
+            self.rows.setdefault(key, row)
+
+    def add_created(self, entries):
+        """Registers entries that were just created, whose reverse
+        relationships are known to be empty.
+        """
+
+        self.add(entries)
+
+        for entry in entries:
+            serializer = self.context.get_serializer(entry.__class__)
+
+            for name, _, _, _ in serializer.related:
+                key = (entry.__class__, name, get_primary_key(entry))
+                self.related.setdefault(key, [])
+
+    def get(self, field, value):
+        """Returns the row that the foreign key field references by value or
+        None if it has not been loaded (or does not exist).
+        """
+
+        key = self.__key(field.rel_model, field.to_field, value)
+        return self.rows.get(key)
+
+    def get_related(self, entry, name):
+        """Returns the rows of the reverse relationship name of entry or None
+        if they have not been loaded.
+        """
+
+        key = (entry.__class__, name, get_primary_key(entry))
+        return self.related.get(key)
+
+    def load(self, field, values):
+        """Loads all rows referenced by field that are not known yet with one
+        query per batch of keys and returns the referenced rows.
+        """
+
+        model = field.rel_model
+        missing = set(
+            value for value in values
+            if self.__key(model, field.to_field, value) not in self.rows
+        )
+
+        for batch in key_batches(missing):
+            for row in model.select().where(field.to_field << batch):
+                key = self.__key(
+                    model,
+                    field.to_field,
+                    getattr(row, field.to_field.name)
+                )
+
+                self.rows[key] = row
+
+        return [
+            self.get(field, value) for value in values
+            if self.get(field, value) is not None
+        ]
+
+    def load_related(self, entries, name, link):
+        """Loads the reverse relationship name for all entries with one query
+        per batch of keys and distributes the children to their parents.
+        Returns the list of all children.
+        """
+
+        model = entries[0].__class__
+        field = get_link_field(link, model)
+
+        keys = set(
+            get_primary_key(entry) for entry in entries
+            if (model, name, get_primary_key(entry)) not in self.related
+        )
+
+        if keys:
+            groups = dict((key, []) for key in keys)
+
+            for batch in key_batches(keys):
+                if link.via:
+                    # n:m, the parent key is only known to the intermediate
+                    # model
+                    query = link.target.select(
+                        link.target,
+                        field.alias(PARENT_KEY)
+                    ).join(link.via).where(field << batch).naive()
+
+                    for row in query:
+                        groups[getattr(row, PARENT_KEY)].append(row)
+
+                else:
+                    query = link.target.select().where(field << batch)
+
+                    for row in query:
+                        groups[row._data.get(field.name)].append(row)
+
+            for key, rows in groups.iteritems():
+                self.related[(model, name, key)] = rows
+                self.add(rows)
+
+        children = []
+        for entry in entries:
+            children += self.get_related(entry, name)
+
+        return children
+
+    def prime(self, entries, fields=None):
+        """Loads the reverse relationships of entries (all of the same model)
+        that are needed to serialize them.
+        """
+
+        if not entries:
+            return
+
+        fields = fields or {}
+        self.add(entries)
+
+        serializer = self.context.get_serializer(entries[0].__class__)
+        selected = fields.get(serializer.type)
+
+        for name, link, _, _ in serializer.related:
+            if selected is not None and name not in selected:
+                # the relationship is not going to be serialized
+                continue
+
+            self.load_related(entries, name, link)
@@ -0,0 +1,192 @@
+# coding: utf-8
+
+from contextlib import contextmanager
+
+from bottle import request
+
+from corkscrew.jsonapi import JsonAPIValidator
+from corkscrew.jsonapi import JsonAPIException
+from corkscrew.jsonapi.strings import M
+from corkscrew.handlers import util
+from corkscrew.handlers.error import ErrorHandler
+
+
+OPERATIONS = u"atomic:operations"
+RESULTS = u"atomic:results"
+
+
+@contextmanager
+def transaction(databases):
+    """Runs the block in a transaction on each of the given databases."""
+
+    if not databases:
+        yield
+        return
+
+    with databases[0].atomic():
+        with transaction(databases[1:]):
+            yield
+
+
+def resolve(identifier, lids):
+    """Returns a copy of a resource identifier or object whose local id is
+    replaced by the id of the resource that was created for it.
+    """
+
+    if not isinstance(identifier, dict) or "lid" not in identifier:
+        return identifier
+
+    identifier = dict(identifier)
+    key = (identifier.get("type"), identifier.pop("lid"))
+
+    if key not in lids:
+        raise JsonAPIException(
+            u"Unknown local id '{}'.".format(key[1]),
+            status=400
+        )
+
+    identifier["id"] = lids[key]
+    return identifier
+
+
+def resolve_linkage(data, lids):
+    """Resolves the local ids of resource linkage."""
+
+    if isinstance(data, list):
+        return [resolve(identifier, lids) for identifier in data]
+
+    return resolve(data, lids)
+
+
+def resolve_relationships(resource, lids):
+    """Resolves the local ids in the relationships of a resource object."""
+
+    if not isinstance(resource.get("relationships"), dict):
+        return resource
+
+    resource = dict(resource)
+    relationships = {}
+
+    for name, relationship in resource["relationships"].iteritems():
+        if isinstance(relationship, dict) and "data" in relationship:
+            relationship = dict(relationship)
+            relationship["data"] = resolve_linkage(relationship["data"], lids)
+
+        relationships[name] = relationship
+
+    resource["relationships"] = relationships
+    return resource
+
+
+def apply_operation(context, operation, lids):
+    """Applies a single operation object and returns its result object."""
+
+    if not isinstance(operation, dict):
+        raise JsonAPIException(M.OPERATION_MUST_BE_OBJECT, status=400)
+
+    op = operation.get("op")
+    ref = resolve(operation.get("ref"), lids)
+    data = operation.get("data")
+
+    target = ref if ref is not None else data
+    _type = target.get("type") if isinstance(target, dict) else None
+
+    factory = context.get_factory_by_type(_type)
+    if factory is None:
+        raise JsonAPIException(
+            u"Unknown resource type '{}'.".format(_type),
+            status=400
+        )
+
+    if op == "add" and ref is None and isinstance(data, dict):
+        lid = data.get("lid")
+        data = dict(data)
+        data.pop("lid", None)
+        data = resolve_relationships(data, lids)
+
+        JsonAPIValidator.validate_create({u"data": data}, _type)
+        created = factory.create_resource(data)
+
+        if lid is not None:
+            lids[(_type, lid)] = unicode(util.get_primary_key(created))
+
+        return {u"data": factory.serialize_created(created)}
+
+    if op == "update" and ref is not None and "relationship" in ref:
+        # replaces the linkage of a relationship
+        _id = unicode(ref.get("id"))
+        request_doc = {u"data": {
+            u"type": _type,
+            u"id": _id,
+            u"relationships": {
+                ref["relationship"]: {
+                    u"data": resolve_linkage(data, lids)
+                }
+            }
+        }}
+
+        JsonAPIValidator.validate_patch(request_doc, _id, _type)
+        factory.patch_resource(_id, request_doc)
+
+        return {}
+
+    if op == "update" and isinstance(data, dict):
+        data = resolve_relationships(resolve(data, lids), lids)
+        request_doc = {u"data": data}
+
+        JsonAPIValidator.validate_patch(request_doc, data.get("id"), _type)
+        factory.patch_resource(data["id"], request_doc)
+
+        return {u"data": factory.serialize(data["id"])}
+
+    if op == "remove" and ref is not None and "relationship" not in ref:
+        factory.delete_resource(ref.get("id"))
+        return {}
+
+    raise JsonAPIException(M.UNSUPPORTED_OPERATION.format(op), status=400)
+
+
+def operations(context):
+    """Returns a function that applies the operations of a request document
+    (atomic extension) in response to POST.
+
+    Operations are applied in order by the factories of the registered
+    models, inside one transaction on every database of these models. If an
+    operation fails, the whole request is rolled back. Resources that are
+    added with a local id ("lid") can be referenced by that id in all later
+    operations.
+    """
+
+    @ErrorHandler
+    def fn_operations():
+        """Applies all operations and returns their results."""
+
+        if request.method == "OPTIONS":
+            return
+
+        request_doc = context.encoder.loads(request.body.getvalue())
+
+        if not isinstance(request_doc, dict) or not isinstance(
+            request_doc.get(OPERATIONS),
+            list
+        ):
+            raise JsonAPIException(M.OPERATIONS_MUST_BE_ARRAY, status=400)
+
+        databases = []
+        for model in context.factories:
+            database = util.get_database(model)
+
+            if database not in databases:
+                databases.append(database)
+
+        lids = {}
+        results = []
+
+        with context.deferred_invalidation():
+            with transaction(databases):
+                for operation in request_doc[OPERATIONS]:
+                    results.append(apply_operation(context, operation, lids))
+
+        return context.encoder.dumps({RESULTS: results})
+
+    return fn_operations
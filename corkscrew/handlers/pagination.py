@@ -0,0 +1,158 @@
+# coding: utf-8
+
+import math
+from urllib import urlencode
+from urlparse import urlunsplit
+
+from bottle import request
+
+from corkscrew.jsonapi import JsonAPIException
+
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 1000
+
+
+class Pagination(object):
+    """Applies the page[...] query parameters of the current request to a
+    peewee query and produces the matching pagination links.
+
+    Two strategies are supported:
+    page[number] and page[size] -- classic offset based pagination
+    page[cursor] and page[size] -- keyset pagination on the primary key
+
+    Rows are ordered by the given ORDER BY expressions and then by the primary
+    key, which keeps pages stable if the expressions are not unique. Keyset
+    pagination is only possible on the primary key alone.
+    """
+
+    def __init__(self, model, page_size=None, max_page_size=None,
+                 ordering=None, count=None):
+        self.primary_key = model._meta.primary_key
+        self.ordering = ordering or []
+        self.count = count or (lambda query: query.count())
+        self.max_page_size = max_page_size or MAX_PAGE_SIZE
+
+        self.size = min(
+            self.__parse_int("page[size]", page_size or DEFAULT_PAGE_SIZE),
+            self.max_page_size
+        )
+
+        self.cursor = request.query.get("page[cursor]")
+        self.number = None
+        self.total = None
+        self.last_key = None
+        self.has_next = False
+
+        if self.cursor is None:
+            self.number = self.__parse_int("page[number]", 1)
+
+        elif self.ordering:
+            raise JsonAPIException(
+                "page[cursor] cannot be combined with sort.",
+                status=400
+            )
+
+        elif self.cursor != "":
+            try:
+                self.cursor = self.primary_key.db_value(self.cursor)
+            except (TypeError, ValueError):
+                raise JsonAPIException(
+                    "The value of page[cursor] is not a valid cursor.",
+                    status=400
+                )
+
+    def __parse_int(self, param, default):
+        value = request.query.get(param)
+
+        if value is None:
+            return default
+
+        try:
+            value = int(value)
+        except ValueError:
+            value = 0
+
+        if value < 1:
+            raise JsonAPIException(
+                "The value of {} must be a positive integer.".format(param),
+                status=400
+            )
+
+        return value
+
+    def iterate(self, query):
+        """Executes the query restricted to the requested page and yields the
+        rows on this page as they are read from the database cursor.
+        """
+
+        if self.cursor is None:
+            self.total = self.count(query)
+            query = query.order_by(
+                *(self.ordering + [self.primary_key])
+            ).limit(self.size + 1).offset((self.number - 1) * self.size)
+
+        else:
+            if self.cursor != "":
+                query = query.where(self.primary_key > self.cursor)
+
+            query = query.order_by(self.primary_key).limit(self.size + 1)
+
+        for i, row in enumerate(query.iterator()):
+            if i == self.size:
+                # one more row than requested, so there is a next page
+                self.has_next = True
+                break
+
+            self.last_key = getattr(row, self.primary_key.name)
+            yield row
+
+    def fetch(self, query):
+        """Executes the query restricted to the requested page and returns
+        the rows on this page.
+        """
+
+        return list(self.iterate(query))
+
+    def __url(self, **page):
+        params = [
+            (key, value) for key, value in request.query.allitems()
+            if not key.startswith("page[")
+        ]
+
+        params.append(("page[size]", self.size))
+        for key, value in sorted(page.iteritems()):
+            params.append(("page[{}]".format(key), value))
+
+        return urlunsplit((
+            request.urlparts.scheme,
+            request.urlparts.netloc,
+            request.urlparts.path,
+            urlencode(params),
+            ""
+        ))
+
+    def links(self):
+        """Returns the pagination links for the page that was fetched."""
+
+        if self.cursor is not None:
+            links = {"first": self.__url(cursor="")}
+
+            if self.has_next:
+                links["next"] = self.__url(cursor=self.last_key)
+
+            return links
+
+        last = max(1, int(math.ceil(self.total / float(self.size))))
+        links = {
+            "first": self.__url(number=1),
+            "last": self.__url(number=last)
+        }
+
+        if self.number > 1:
+            links["prev"] = self.__url(number=min(self.number - 1, last))
+
+        if self.has_next:
+            links["next"] = self.__url(number=self.number + 1)
+
+        return links
@@ -1,15 +1,26 @@
 # coding: utf-8
 
-import json
+from collections import OrderedDict
+from itertools import chain, islice
 
-from peewee import ForeignKeyField
 from bottle import request, response
 
+from corkscrew.cache import resource_tag, type_tag, membership_tag
 from corkscrew.jsonapi import JsonAPIValidator
 from corkscrew.jsonapi import JsonAPIResponse
 from corkscrew.jsonapi import JsonAPIException
 from corkscrew.handlers import util
+from corkscrew.handlers import bulk
 from corkscrew.handlers import ErrorHandler, Listener
+from corkscrew.handlers.etag import digest, version_etag, not_modified
+from corkscrew.handlers.etag import next_version
+from corkscrew.handlers.counting import Counter
+from corkscrew.handlers.filtering import Filter
+from corkscrew.handlers.include import IncludePlan
+from corkscrew.handlers.loader import Loader
+from corkscrew.handlers.pagination import Pagination
+from corkscrew.handlers.sorting import Sort
+from corkscrew.handlers.streaming import chunks, stream_document
 
 
 class PeeweeHandlerFactory(object):
@@ -20,138 +31,689 @@ class PeeweeHandlerFactory(object):
     resources are created, retrieved, listed, patched or deleted.
     """
 
-    def __init__(self, model, related=None, listener=None):
+    def __init__(self, model, related=None, listener=None,
+                 page_size=None, max_page_size=None, streaming=False,
+                 filterable=None, sortable=None, version_field=None,
+                 cached=False, total=None):
         """Return a new instance of PeeweeHandlerFactory.
 
         Keyword arguments:
         related -- a dictionary in the form of {"relation": OtherModel}
         listener -- a corkscrew.handlers.listener.Listener subclass
+        page_size -- the number of resources on a page if the client does not
+                     ask for a specific page[size]
+        max_page_size -- the upper bound for a page[size] requested by clients
+        streaming -- if True, collections are encoded while they are read from
+                     the database instead of being built in memory first;
+                     after_list receives the document without its data
+        filterable -- a list of field names that clients may use in
+                      filter[...] query parameters
+        sortable -- a list of field names that clients may sort by, fields of
+                    forward relationships are given as "relation.field"
+        version_field -- the name of a field that changes whenever a resource
+                         is modified (a revision counter or a modification
+                         timestamp), entity tags are derived from it instead
+                         of the response body so that unchanged resources are
+                         not serialized at all; PATCH requests advance it in
+                         the statement that updates the resource
+        cached -- if True, single resources are kept in the cache of the
+                  application (see corkscrew.cache.ResourceCache) once they
+                  were encoded; writes through any endpoint of the
+                  application invalidate the documents they affect, in all
+                  processes if the cache's backend is shared
+        total -- "exact" to add the number of resources in a collection or
+                 related collection as meta.total to the response, or
+                 "estimated" to use the statistics of the database instead
+                 of counting unfiltered collections of very large tables;
+                 counts are cached until a resource of the type is written
+                 through the application, so writes that bypass it show up
+                 once the cache entry expires
         """
 
         self.model = model
         self.related = related or {}
         self.listener = listener or Listener()
+        self.page_size = page_size
+        self.max_page_size = max_page_size
+        self.streaming = streaming
+        self.filterable = filterable or []
+        self.sortable = sortable or []
+        self.version_field = version_field
+        self.cached = cached
+        self.total = total
         self.context = None
 
-    def __entry_to_resource(self, entry,
-                            include=None, fields=None, linkage=False):
-        """Formats a peewee database row as a JsonAPIResource."""
+    def __entries_to_resources(self, model, entries, linkage=False,
+                               plan=None, fields=None, loader=None):
+        """Formats a list of peewee database rows of the given model as
+        resource objects and returns them together with the resources that
+        are to be included according to the include parameter.
 
-        return util.entry_to_resource(entry, self.context, include or [],
-                                      fields or {}, linkage)
+        Relationships are loaded for all rows at once, once per relationship
+        and level of the include tree.
+        """
 
-    def __get_reverse_field(self, target):
-        """Returns the reverse reference from a target model to self.model."""
+        plan = plan or IncludePlan(model, self.context, request.query.include)
+        serializer = self.context.get_serializer(model)
+
+        if linkage:
+            return [serializer.linkage(entry) for entry in entries], []
+
+        loader = loader or Loader(self.context)
+        fields = fields or util.parse_fields_parameter()
+        base_uri = request.urlparts.scheme + "://" + request.urlparts.netloc
+
+        loader.prime(entries, fields)
+        data = serializer.serialize(entries, base_uri, fields, loader)
+
+        groups = OrderedDict()
+        for row in plan.execute(entries, loader):
+            groups.setdefault(row.__class__, []).append(row)
+
+        included = []
+        for rows_model, rows in groups.iteritems():
+            loader.prime(rows, fields)
+            included += self.context.get_serializer(rows_model).serialize(
+                rows,
+                base_uri,
+                fields,
+                loader
+            )
+
+        return data, included
+
+    def __stream(self, model, entries, response_doc, finish=None,
+                 linkage=False):
+        """Returns a generator that encodes the collection of entries chunk by
+        chunk while they are read from the database.
+        """
+
+        # everything that depends on the request, including the queries of
+        # the first chunk, is evaluated before the first byte is sent, so that
+        # errors can still be reported
+        plan = IncludePlan(model, self.context, request.query.include)
+        fields = util.parse_fields_parameter()
+
+        def resources():
+            for chunk in chunks(entries):
+                yield self.__entries_to_resources(
+                    model,
+                    chunk,
+                    linkage=linkage,
+                    plan=plan,
+                    fields=fields
+                )
+
+        def members():
+            if finish:
+                finish()
+
+            members = {"links": dict(response_doc.links)}
+
+            if getattr(response_doc, "meta", None):
+                members["meta"] = dict(response_doc.meta)
+
+            return members
+
+        remaining = resources()
+        first = list(islice(remaining, 1))
 
-        t = target.via or target.target
+        return stream_document(
+            chain(first, remaining),
+            members,
+            self.context.encoder
+        )
+
+    def __version_etag(self, model, entries, loader, *extra):
+        """Returns an entity tag for the resource objects of entries that is
+        computed without serializing them or None if the model has no version
+        field or the response is going to include other resources.
+        """
+
+        factory = self.context.get_factory(model)
+
+        if not factory or not factory.version_field or request.query.include:
+            return None
+
+        fields = util.parse_fields_parameter()
+        loader.prime(entries, fields)
+
+        return version_etag(
+            self.context.get_serializer(model),
+            entries,
+            factory.version_field,
+            loader,
+            fields,
+            request.url,
+            *extra
+        )
+
+    def __respond(self, response_doc, etag=None):
+        """Encodes the response document unless the client already has it.
+
+        Without an entity tag one is computed from the encoded document.
+        """
+
+        body = self.context.encoder.dumps(dict(response_doc))
+
+        if not_modified(etag or digest(body)):
+            return ""
+
+        return body
+
+    def __cache_key(self, _id):
+        """Returns the key of the single resource document for _id."""
+
+        fields = util.parse_fields_parameter()
+
+        return (
+            self.model._meta.name,
+            unicode(_id),
+            tuple(sorted((k, tuple(v)) for k, v in fields.iteritems())),
+            request.query.include,
+            request.urlparts.scheme + "://" + request.urlparts.netloc
+        )
 
-        for f in t._meta.sorted_fields:
-            if target.on:
-                if target.on == f.name:
-                    return f
+    def __cache_tags(self, resources):
+        """Returns the tags of a document with the given resource objects."""
 
-            elif isinstance(f, ForeignKeyField) and f.rel_model == self.model:
-                return f
+        tags = set()
+        types = set()
+
+        for resource in resources:
+            tags.add(resource_tag(resource["type"], resource["id"]))
+            types.add(resource["type"])
+
+        for serializer in self.context.serializers.values():
+            if serializer.type in types:
+                tags.add(type_tag(serializer.type))
+
+                for _, _, target, _ in serializer.related:
+                    tags.add(membership_tag(target))
+
+        return tags
+
+    def __invalidate(self, *tags):
+        """Invalidates the cached documents and counts with one of the given
+        tags.
+        """
+
+        self.context.invalidate(*tags)
+
+    def __written(self, _id):
+        """Invalidates the cached documents that contain the resource _id."""
+
+        self.__invalidate(
+            resource_tag(self.model._meta.name, _id),
+            membership_tag(self.model._meta.name)
+        )
+
+    def __meta(self, page, counter, query):
+        """Returns the meta object of a collection on the given page."""
+
+        total = page.total if page.total is not None else counter(query)
+        meta = {"total": total}
+
+        if counter.is_estimate:
+            meta["estimated"] = True
+
+        return meta
+
+    def __get_reverse_field(self, target):
+        """Returns the reverse reference from a target model to self.model."""
+
+        return util.get_link_field(target, self.model)
 
     def __get(self, _id):
         """Retrieves a singlar resource by its ID."""
 
         response_doc = JsonAPIResponse(request.url)
+        cache = self.context.cache if self.cached else None
+
+        if cache is not None:
+            key = self.__cache_key(_id)
+            cached = cache.get(key)
+
+            if cached is not None:
+                # the entity tag is stored with the document, so that it
+                # does not change between misses and hits
+                body, etag = cached
+                return "" if not_modified(etag) else body
+
+            # writes from now on make the document stale
+            since = cache.now()
 
         entry = self.model.select().where(
             self.model._meta.primary_key == _id
         ).get()
 
-        data, included = self.__entry_to_resource(
-            entry,
-            include=request.query.include.split(","),
-            fields=util.parse_fields_parameter()
+        loader = Loader(self.context)
+        etag = self.__version_etag(self.model, [entry], loader)
+
+        if etag and not_modified(etag):
+            return ""
+
+        data, included = self.__entries_to_resources(
+            self.model,
+            [entry],
+            loader=loader
         )
 
-        response_doc.data = data
+        response_doc.data = data[0]
         response_doc.included = included
 
-        return json.dumps(dict(response_doc), sort_keys=True)
+        if cache is not None:
+            body = self.context.encoder.dumps(dict(response_doc))
+            etag = etag or digest(body)
+
+            cache.set(
+                key,
+                [body, etag],
+                self.__cache_tags(data + included),
+                since=since
+            )
+
+            return "" if not_modified(etag) else body
+
+        return self.__respond(response_doc, etag)
 
     def __patch_relationships(self, _id, relationships):
-        """Works through a data.relationships object and patches the given
-        relationships in the data store.
+        """Works through the to-many relationships of a data.relationships
+        object and patches them in the data store.
         """
 
-        entry = self.model.select().where(
-            self.model._meta.primary_key == _id
-        ).get()
-
         for key, relationship in relationships.iteritems():
 
-            if key in self.related:
-                # target model
-                target = self.related[key]
-
-                if not isinstance(target, util.Link):
-                    target = util.Link(target)
-
-                if target.via:
-                    reverse_field = self.__get_reverse_field(target)
-                    target.via.delete().where(reverse_field == entry).execute()
-
-                    if isinstance(relationship["data"], list):
-                        for linkage in relationship["data"]:
-                            rel = target.via()
-                            setattr(rel, reverse_field.name, entry)
-                            setattr(
-                                rel,
-                                target.target._meta.name,
-                                linkage["id"]
-                            )
-                            rel.save()
-
-                else:
-
-                    # this is a reverse relationship that will be updated
-                    rev_field = self.__get_reverse_field(target)
-
-                    with target.target._meta.database.atomic():
-                        # remove all existing links
-                        for row in target.target.select().where(
-                            rev_field == entry
-                        ):
-                            if rev_field.null:
-                                setattr(row, rev_field.name, None)
-                                row.save()
-                            else:
-                                raise JsonAPIException(
-                                    "You can't orphan a " + str(row)
-                                    + " resource.",
-                                    status=400
-                                )
-
-                        if isinstance(relationship["data"], list):
-                            # add new links
-                            for linkage in relationship["data"]:
-                                row = target.target.select().where(
-                                    target.target._meta.primary_key
-                                    == linkage["id"]
-                                ).get()
-
-                                setattr(row, rev_field.name, entry)
-                                row.save()
-
-            elif relationship["data"] is None:
-                # this is a direct relationship that will be set to null
-                setattr(entry, key, None)
-
-            elif hasattr(entry, key):
-                # this is a direct relationship with a new value
-                setattr(entry, key, relationship["data"]["id"])
-
-            else:
+            if key not in self.related:
                 # we should not encounter a non existant field
                 raise JsonAPIException(
                     "Encountered unknown relationship field: '{}'.".format(key)
                 )
 
-        entry.save()
+            # target model
+            target = self.related[key]
+
+            if not isinstance(target, util.Link):
+                target = util.Link(target)
+
+            if target.via:
+                reverse_field = self.__get_reverse_field(target)
+
+                with target.via._meta.database.atomic():
+                    self.__replace_links(
+                        target.via,
+                        reverse_field,
+                        target.via._meta.fields[target.target._meta.name],
+                        _id,
+                        relationship["data"] or []
+                    )
+
+            else:
+
+                # this is a reverse relationship that will be updated
+                rev_field = self.__get_reverse_field(target)
+
+                with target.target._meta.database.atomic():
+                    self.__replace_children(
+                        target.target,
+                        rev_field,
+                        _id,
+                        relationship["data"] or []
+                    )
+
+                # the children that were moved are not known anymore
+                self.__invalidate(type_tag(target.target._meta.name))
+
+    def __replace_children(self, model, rev_field, entry, linkage):
+        """Makes the rows of model that are identified by linkage the only
+        ones that refer to entry (a primary key) via rev_field, with one
+        query for the current children and one UPDATE for the removed and
+        the added ones.
+        This should be called inside a transaction.
+        """
+
+        primary_key = model._meta.primary_key
+
+        children = set(
+            key for key, in model.select(primary_key).where(
+                rev_field == entry
+            ).tuples()
+        )
+
+        keys = OrderedDict.fromkeys(
+            primary_key.db_value(identifier["id"]) for identifier in linkage
+        )
+
+        removed = [key for key in children if key not in keys]
+        added = [key for key in keys if key not in children]
+
+        if removed and not rev_field.null:
+            raise JsonAPIException(
+                "You can't orphan a " + str(
+                    model.select().where(primary_key == removed[0]).get()
+                ) + " resource.",
+                status=400
+            )
+
+        # the children change their linkage, which advances their version
+        version = self.__next_version(model)
+
+        bulk.update_keys(model, removed, **dict(version, **{
+            rev_field.name: None
+        }))
+
+        if bulk.update_keys(model, added, **dict(version, **{
+            rev_field.name: entry
+        })) < len(added):
+            raise model.DoesNotExist()
+
+    def __replace_links(self, via, rev_field, target_field, entry, linkage):
+        """Makes the targets identified by linkage the only ones that are
+        linked to entry (a primary key) through the rows of the via model.
+        Only the links that differ are deleted (one DELETE) and inserted (one
+        INSERT), in batches below the parameter limit. This should be called
+        inside a transaction.
+        """
+
+        linked = set(
+            key for key, in via.select(target_field).where(
+                rev_field == entry
+            ).tuples()
+        )
+
+        keys = OrderedDict.fromkeys(
+            target_field.db_value(identifier["id"]) for identifier in linkage
+        )
+
+        removed = [key for key in linked if key not in keys]
+        added = [key for key in keys if key not in linked]
+
+        for batch in util.key_batches(removed):
+            via.delete().where(
+                rev_field == entry,
+                target_field << batch
+            ).execute()
+
+        for batch in bulk.batches(
+            {rev_field.name: entry, target_field.name: key} for key in added
+        ):
+            via.insert_many(batch).execute()
+
+    def __create_attributes(self, resource):
+        """Returns the field values of a resource object that is going to be
+        created.
+        """
+
+        attributes = {}
+
+        if "attributes" in resource:
+            attributes = dict(resource["attributes"])
+
+        if "relationships" in resource:
+            for k, dat in resource["relationships"].iteritems():
+                attributes[k] = dat["data"]["id"]
+
+        if "id" in resource:
+            primary = self.model._meta.primary_key.name
+            attributes[primary] = resource["id"]
+
+        return attributes
+
+    def create_resource(self, resource):
+        """Creates a resource from a validated resource object and returns
+        the new entry.
+        """
+
+        self.context.get_schema(self.model).validate_create(resource)
+
+        self.listener.before_create(request)
+
+        created = self.__new_entry(resource)
+
+        # unknown values (defaults of the database) are read back by the
+        # INSERT statement itself where RETURNING is supported
+        meta = self.model._meta
+        missing = [
+            field for field in meta.sorted_fields
+            if field.name not in created._data
+            and field is not meta.primary_key
+        ]
+
+        if missing and util.get_database(self.model).returning_clause:
+            row = self.model.insert(**created._data).returning().dicts()
+            created._data.update(row.execute().next())
+        else:
+            created.save(force_insert=True)
+            self.__read_defaults([created], missing)
+
+        created._prepare_instance()
+
+        self.__written(util.get_primary_key(created))
+
+        self.listener.after_create(created)
+
+        return created
+
+    def patch_resource(self, _id, request_doc):
+        """Applies the resource object of a validated PATCH request document
+        to the resource _id.
+
+        The attributes and to-one relationships that are present are written
+        with one UPDATE statement, whose row count tells if the resource
+        exists, without reading the row first.
+        """
+
+        resource = request_doc["data"]
+        self.context.get_schema(self.model).validate_patch(resource)
+
+        self.listener.before_patch(request_doc)
+
+        key = self.model._meta.primary_key.db_value(_id)
+        values = dict(resource.get("attributes") or {})
+        relationships = {}
+
+        for name, relationship in (
+            resource.get("relationships") or {}
+        ).iteritems():
+            if name in self.related:
+                relationships[name] = relationship
+            else:
+                data = relationship["data"]
+                values[name] = data["id"] if data else None
+
+        if relationships:
+            # invalidate once the transaction has been committed
+            with self.context.deferred_invalidation():
+                with self.model._meta.database.atomic():
+                    self.__patch_row(key, values)
+
+                    # patch given relationships
+                    self.__patch_relationships(key, relationships)
+
+        else:
+            self.__patch_row(key, values)
+
+        self.__written(_id)
+
+    def __next_version(self, model, values=None):
+        """Returns the version field value for an UPDATE of the given field
+        values of model, which save() of the model would maintain otherwise.
+        """
+
+        factory = self.context.get_factory(model)
+        name = factory.version_field if factory else None
+        field = model._meta.fields.get(name)
+
+        if field is None or name in (values or {}):
+            return {}
+
+        return {field.name: next_version(field)}
+
+    def __patch_row(self, key, values):
+        """Writes the field values of the resource key or makes sure that
+        it exists if there are none.
+        """
+
+        if values:
+            values = dict(values, **self.__next_version(self.model, values))
+            found = bulk.update_row(self.model, key, values)
+        else:
+            found = bool(bulk.existing_keys(self.model, [key]))
+
+        if not found:
+            raise self.model.DoesNotExist()
+
+    def delete_resource(self, _id):
+        """Deletes the resource _id with one DELETE statement."""
+
+        self.listener.before_delete(_id)
+
+        primary_key = self.model._meta.primary_key
+
+        if not self.model.delete().where(
+            primary_key == primary_key.db_value(_id)
+        ).execute():
+            raise self.model.DoesNotExist()
+
+        self.__written(_id)
+
+        self.listener.after_delete(_id)
+
+    def serialize_created(self, entry):
+        """Returns the resource object of an entry that was just created."""
+
+        loader = Loader(self.context)
+        loader.add_created([entry])
+
+        data, _ = self.__entries_to_resources(
+            self.model,
+            [entry],
+            loader=loader
+        )
+
+        return data[0]
+
+    def serialize(self, _id):
+        """Returns the resource object of the resource _id."""
+
+        entry = self.model.select().where(
+            self.model._meta.primary_key == _id
+        ).get()
+
+        data, _ = self.__entries_to_resources(self.model, [entry])
+        return data[0]
+
+    def __bulk_create(self, request_doc):
+        """Creates all resources of a request document whose primary data is
+        an array (bulk extension) and returns them.
+
+        The rows are built in memory, so that default values are known without
+        reading them back, and inserted in batches in a single transaction.
+        Only the defaults of the database are read back, in batches as well.
+        """
+
+        JsonAPIValidator.validate_bulk_create(
+            request_doc,
+            self.model._meta.name
+        )
+
+        schema = self.context.get_schema(self.model)
+        for resource in request_doc["data"]:
+            schema.validate_create(resource)
+
+        self.listener.before_create(request)
+
+        primary = self.model._meta.primary_key.name
+
+        created = [
+            self.__new_entry(resource) for resource in request_doc["data"]
+        ]
+
+        with self.model._meta.database.atomic():
+            keys = bulk.insert_rows(
+                self.model,
+                [dict(entry._data) for entry in created]
+            )
+
+        for entry, key in zip(created, keys):
+            entry._data[primary] = key
+
+        self.__read_defaults(created, [
+            field for field in self.model._meta.sorted_fields
+            if any(field.name not in entry._data for entry in created)
+        ])
+
+        # new resources are only part of to-many relationships and counts
+        self.__invalidate(membership_tag(self.model._meta.name))
+
+        self.listener.after_bulk_create(created)
+
+        return self.__respond_created(created)
+
+    def __read_defaults(self, created, fields):
+        """Reads the values that the database filled in for the given fields
+        of created entries with one query per batch of keys.
+        """
+
+        primary_key = self.model._meta.primary_key
+        fields = [
+            field for field in fields
+            if util.has_database_default(field)
+            and field is not primary_key
+        ]
+
+        if not fields:
+            return
+
+        entries = dict(
+            (util.get_primary_key(entry), entry) for entry in created
+        )
+
+        for batch in util.key_batches(entries):
+            for row in self.model.select(primary_key, *fields).where(
+                primary_key << batch
+            ).dicts():
+                entry = entries[row.pop(primary_key.name)]
+
+                for name, value in row.iteritems():
+                    entry._data.setdefault(name, value)
+
+    def __new_entry(self, resource):
+        """Returns an unsaved entry for a resource object whose values are
+        represented as if they were read from the database.
+        """
+
+        fields = self.model._meta.fields
+        entry = self.model(**self.__create_attributes(resource))
+
+        for name, value in entry._data.iteritems():
+            if name in fields and value is not None:
+                field = fields[name]
+                entry._data[name] = field.python_value(field.db_value(value))
+
+        return entry
+
+    def __respond_created(self, created, single=False):
+        """Serializes entries that were just created from memory. They are
+        not part of any to-many relationship yet.
+        """
+
+        loader = Loader(self.context)
+        loader.add_created(created)
+
+        response_doc = JsonAPIResponse(request.url)
+        data, response_doc.included = self.__entries_to_resources(
+            self.model,
+            created,
+            loader=loader
+        )
+
+        response_doc.data = data[0] if single else data
+
+        return self.__respond(
+            response_doc,
+            self.__version_etag(self.model, created, loader)
+        )
 
     def create(self):
         """Returns a function that creates resources in response to POST."""
@@ -163,37 +725,27 @@ class PeeweeHandlerFactory(object):
             if request.method == "OPTIONS":
                 return
 
-            request_doc = json.loads(request.body.getvalue())
+            request_doc = self.context.encoder.loads(request.body.getvalue())
+
+            if isinstance(request_doc, dict) and isinstance(
+                request_doc.get("data"),
+                list
+            ):
+                return self.__bulk_create(request_doc)
+
             JsonAPIValidator.validate_create(
                 request_doc,
                 self.model._meta.name
             )
 
-            self.listener.before_create(request)
-
-            attributes = {}
-
-            if "attributes" in request_doc["data"]:
-                attributes = request_doc["data"]["attributes"]
-
-            if "relationships" in request_doc["data"]:
-                for k, dat in request_doc["data"]["relationships"].iteritems():
-                    attributes[k] = dat["data"]["id"]
-
-            if "id" in request_doc["data"]:
-                primary = self.model._meta.primary_key.name
-                attributes[primary] = request_doc["data"]["id"]
-
-            created = self.model.create(**attributes)
-
-            self.listener.after_create(created)
+            created = self.create_resource(request_doc["data"])
 
             response.set_header("Location", "{}/{}".format(
                 request.url,
                 util.get_primary_key(created))
             )
 
-            return self.__get(util.get_primary_key(created))
+            return self.__respond_created([created], single=True)
 
         return fn_create
 
@@ -234,18 +786,17 @@ class PeeweeHandlerFactory(object):
             ).get()
 
             relation = getattr(entry, relationship)
-            # non existant relationships must return successful with data: null
-            data, included = self.__entry_to_resource(
-                relation,
-                include=request.query.include.split(","),
-                fields=util.parse_fields_parameter(),
+            data, included = self.__entries_to_resources(
+                self.model._meta.fields[relationship].rel_model,
+                [relation] if relation else [],
                 linkage=linkage
-            ) if relation else (None, [])
+            )
 
-            response_doc.data = data
+            # non existant relationships must return successful with data: null
+            response_doc.data = data[0] if data else None
             response_doc.included = included
 
-            return json.dumps(dict(response_doc), sort_keys=True)
+            return self.__respond(response_doc)
 
         return fn_get_relationship
 
@@ -278,18 +829,91 @@ class PeeweeHandlerFactory(object):
             else:
                 query = target.target.select().where(reverse_field == _id)
 
-            for entry in query:
-                data, included = self.__entry_to_resource(
-                    entry,
-                    include=request.query.include.split(","),
-                    fields=util.parse_fields_parameter(),
+            # the filters and sort keys that are allowed for the target's own
+            # endpoint apply
+            target_factory = self.context.get_factory(target.target)
+            query = Filter(
+                target.target,
+                target_factory.filterable if target_factory else None
+            ).apply(query)
+
+            query, ordering = Sort(
+                target.target,
+                target_factory.sortable if target_factory else None
+            ).apply(query)
+
+            finish = None
+
+            if not linkage:
+                # related resources are paginated, resource linkage is not
+                counter = Counter(
+                    target.target,
+                    self.context.count_cache(),
+                    parent=(self.model._meta.name, _id)
+                )
+
+                page = Pagination(
+                    target.target,
+                    self.page_size,
+                    self.max_page_size,
+                    ordering,
+                    counter
+                )
+
+                rows = query
+                query = page.iterate(rows)
+
+                def finish():
+                    response_doc.links.update(page.links())
+
+                    if self.total:
+                        response_doc.meta = self.__meta(page, counter, rows)
+
+            else:
+                if ordering:
+                    query = query.order_by(*ordering)
+
+                query = query.iterator()
+
+            if self.streaming:
+                return self.__stream(
+                    target.target,
+                    query,
+                    response_doc,
+                    finish,
                     linkage=linkage
                 )
 
-                response_doc.data.append(data)
-                response_doc.included += included
+            entries = list(query)
+
+            if finish:
+                finish()
 
-            return json.dumps(dict(response_doc), sort_keys=True)
+            loader = Loader(self.context)
+            etag = None
+
+            if not linkage:
+                etag = self.__version_etag(
+                    target.target,
+                    entries,
+                    loader,
+                    repr(sorted(response_doc.links.items())),
+                    repr(getattr(response_doc, "meta", None))
+                )
+
+                if etag and not_modified(etag):
+                    return ""
+
+            response_doc.data, response_doc.included = (
+                self.__entries_to_resources(
+                    target.target,
+                    entries,
+                    linkage=linkage,
+                    loader=loader
+                )
+            )
+
+            return self.__respond(response_doc, etag)
 
         return fn_get_reverse_relationship
 
@@ -306,18 +930,70 @@ class PeeweeHandlerFactory(object):
             self.listener.before_list()
             response_doc = JsonAPIResponse(request.url)
 
-            for entry in self.model.select():
-                data, included = self.__entry_to_resource(
-                    entry,
-                    include=request.query.include.split(","),
-                    fields=util.parse_fields_parameter()
+            conditions = Filter(self.model, self.filterable)
+            query = conditions.apply(self.model.select())
+
+            # statistics only know the size of the whole table
+            counter = Counter(
+                self.model,
+                self.context.count_cache(),
+                estimated=(
+                    self.total == "estimated" and not conditions.conditions
+                )
+            )
+
+            query, ordering = Sort(self.model, self.sortable).apply(query)
+            page = Pagination(
+                self.model,
+                self.page_size,
+                self.max_page_size,
+                ordering,
+                counter
+            )
+
+            def finish():
+                response_doc.links.update(page.links())
+
+                if self.total:
+                    response_doc.meta = self.__meta(page, counter, query)
+
+            if self.streaming:
+                def finish_stream():
+                    finish()
+                    self.listener.after_list(response_doc)
+
+                return self.__stream(
+                    self.model,
+                    page.iterate(query),
+                    response_doc,
+                    finish_stream
                 )
 
-                response_doc.data.append(data)
-                response_doc.included += included
+            entries = page.fetch(query)
+            finish()
+
+            loader = Loader(self.context)
+            etag = self.__version_etag(
+                self.model,
+                entries,
+                loader,
+                repr(sorted(response_doc.links.items())),
+                repr(getattr(response_doc, "meta", None))
+            )
+
+            if etag and not_modified(etag):
+                return ""
+
+            response_doc.data, response_doc.included = (
+                self.__entries_to_resources(
+                    self.model,
+                    entries,
+                    loader=loader
+                )
+            )
 
             self.listener.after_list(response_doc)
-            return json.dumps(dict(response_doc), sort_keys=True)
+            return self.__respond(response_doc, etag)
 
         return fn_list
 
@@ -331,7 +1007,7 @@ class PeeweeHandlerFactory(object):
             if request.method == "OPTIONS":
                 return
 
-            request_doc = json.loads(request.body.getvalue())
+            request_doc = self.context.encoder.loads(request.body.getvalue())
             # JsonAPIValidator.validate_patch(request_doc, _id, None)
 
             # PATCH /res/<_id>/relationships/other_res is equal to patching the
@@ -366,32 +1042,16 @@ class PeeweeHandlerFactory(object):
             if request.method == "OPTIONS":
                 return
 
-            request_doc = request_doc or json.loads(request.body.getvalue())
+            request_doc = request_doc or self.context.encoder.loads(
+                request.body.getvalue()
+            )
             JsonAPIValidator.validate_patch(
                 request_doc,
                 _id,
                 self.model._meta.name
             )
 
-            self.listener.before_patch(request_doc)
-
-            entry = self.model.select().where(
-                self.model._meta.primary_key == _id
-            ).get()
-
-            if "attributes" in request_doc["data"]:
-                # each attribute that is present will be updated
-                for key, val in request_doc["data"]["attributes"].iteritems():
-                    setattr(entry, key, val)
-
-                entry.save()
-
-            if "relationships" in request_doc["data"]:
-                # patch given relationships
-                self.__patch_relationships(
-                    _id,
-                    request_doc["data"]["relationships"]
-                )
+            self.patch_resource(_id, request_doc)
 
             if self.listener.after_patch(response):
                 # if the listener changed something else then return the object
@@ -403,6 +1063,102 @@ class PeeweeHandlerFactory(object):
 
         return fn_patch
 
+    def bulk_patch(self):
+        """Returns a function that patches several resources in response to a
+        PATCH request to the collection (bulk extension).
+        """
+
+        @ErrorHandler
+        def fn_bulk_patch():
+            """Patches all resources of the request document.
+
+            Attributes and to-one relationships of all resources are written
+            with a single UPDATE statement per batch. The whole request is
+            carried out in one transaction, so that it fails as a whole if
+            one of the resources does not exist.
+            """
+
+            if request.method == "OPTIONS":
+                return
+
+            request_doc = self.context.encoder.loads(request.body.getvalue())
+            JsonAPIValidator.validate_bulk_patch(
+                request_doc,
+                self.model._meta.name
+            )
+
+            schema = self.context.get_schema(self.model)
+            for resource in request_doc["data"]:
+                schema.validate_patch(resource)
+
+            self.listener.before_bulk_patch(request_doc)
+
+            primary_key = self.model._meta.primary_key
+
+            # {primary key: {field name: value}}, later resources win
+            rows = OrderedDict()
+            relationships = []
+
+            for resource in request_doc["data"]:
+                key = primary_key.db_value(resource["id"])
+                values = rows.setdefault(key, {})
+                values.update(resource.get("attributes") or {})
+
+                for name, relationship in (
+                    resource.get("relationships") or {}
+                ).iteritems():
+                    if name in schema.foreign_keys:
+                        data = relationship["data"]
+                        values[name] = data["id"] if data else None
+                    else:
+                        relationships.append((key, {name: relationship}))
+
+            # invalidate once the transaction has been committed
+            with self.context.deferred_invalidation():
+                with self.model._meta.database.atomic():
+                    if len(bulk.existing_keys(self.model, rows)) < len(rows):
+                        raise self.model.DoesNotExist()
+
+                    bulk.update_rows(
+                        self.model,
+                        rows.items(),
+                        **self.__next_version(self.model)
+                    )
+
+                    for key, relationship in relationships:
+                        self.__patch_relationships(key, relationship)
+
+            self.__invalidate(*[
+                tag for key in rows for tag in (
+                    resource_tag(self.model._meta.name, key),
+                    membership_tag(self.model._meta.name)
+                )
+            ])
+
+            if self.listener.after_bulk_patch(rows.keys(), response):
+                # return the patched resources in the order of the request
+                entries = dict(
+                    (util.get_primary_key(entry), entry)
+                    for entry in self.model.select().where(
+                        primary_key << rows.keys()
+                    )
+                )
+
+                response_doc = JsonAPIResponse(request.url)
+                response_doc.data, response_doc.included = (
+                    self.__entries_to_resources(
+                        self.model,
+                        [entries[key] for key in rows]
+                    )
+                )
+
+                return self.__respond(response_doc)
+
+            else:
+                response.status = 204
+
+        return fn_bulk_patch
+
     def delete(self):
         """Returns a function that handles DELETE requests."""
 
@@ -413,17 +1169,79 @@ class PeeweeHandlerFactory(object):
             if request.method == "OPTIONS":
                 return
 
-            self.listener.before_delete(_id)
+            self.delete_resource(_id)
 
-            entry = self.model.select().where(
-                self.model._meta.primary_key == _id
-            ).get()
+            # return a 204 No Content status
+            response.status = 204
+
+        return fn_delete
+
+    def bulk_delete(self):
+        """Returns a function that deletes several resources in response to a
+        DELETE request to the collection (bulk extension).
+        """
+
+        @ErrorHandler
+        def fn_bulk_delete():
+            """Deletes the resources identified by the request document or,
+            without a request document, all resources that match the
+            filter[...] query parameters.
+
+            The resources are deleted with DELETE statements on their primary
+            keys in one transaction, so that nothing is deleted if one of the
+            identified resources does not exist.
+            """
+
+            if request.method == "OPTIONS":
+                return
 
-            entry.delete_instance()
+            primary_key = self.model._meta.primary_key
+            body = request.body.getvalue()
 
-            self.listener.after_delete(_id)
+            if body.strip():
+                request_doc = self.context.encoder.loads(body)
+                JsonAPIValidator.validate_bulk_patch(
+                    request_doc,
+                    self.model._meta.name
+                )
+
+                keys = list(OrderedDict.fromkeys(
+                    primary_key.db_value(resource["id"])
+                    for resource in request_doc["data"]
+                ))
+
+            else:
+                condition = Filter(self.model, self.filterable)
+
+                if not condition.conditions:
+                    raise JsonAPIException(
+                        "Deleting a collection requires a request document "
+                        "or filter parameters.",
+                        status=400
+                    )
+
+                keys = [
+                    key for key, in condition.apply(
+                        self.model.select(primary_key)
+                    ).order_by(primary_key).tuples()
+                ]
+
+            self.listener.before_bulk_delete(keys)
+
+            with self.model._meta.database.atomic():
+                if bulk.delete_rows(self.model, keys) < len(keys):
+                    raise self.model.DoesNotExist()
+
+            self.__invalidate(*[
+                tag for key in keys for tag in (
+                    resource_tag(self.model._meta.name, key),
+                    membership_tag(self.model._meta.name)
+                )
+            ])
+
+            self.listener.after_bulk_delete(keys)
 
             # return a 204 No Content status
             response.status = 204
 
-        return fn_delete
+        return fn_bulk_delete
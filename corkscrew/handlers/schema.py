@@ -0,0 +1,158 @@
+# coding: utf-8
+
+from peewee import ForeignKeyField, PrimaryKeyField
+from peewee import BooleanField, IntegerField, FloatField, DecimalField
+from peewee import CharField, TextField, UUIDField
+from peewee import DateField, DateTimeField, TimeField
+
+from corkscrew.jsonapi import JsonAPIException
+from corkscrew.handlers.util import has_database_default
+
+
+# (field classes, accepted python types, description), the first match wins
+FIELD_TYPES = [
+    ((BooleanField,), (bool,), "a boolean"),
+    ((IntegerField,), (int, long), "an integer"),
+    ((FloatField, DecimalField), (int, long, float), "a number"),
+    (
+        (CharField, TextField, UUIDField, DateField, DateTimeField, TimeField),
+        (basestring,),
+        "a string"
+    )
+]
+
+
+class RequestSchema(object):
+    """The attributes and relationships that request documents may contain
+    for the resources of one model.
+
+    The schema is compiled once from the fields of the model and its
+    registered reverse relationships, so that a document can be checked in
+    a single pass before any query is issued.
+    """
+
+    def __init__(self, model, context):
+        meta = model._meta
+        factory = context.get_factory(model)
+
+        # {name: (accepted python types or None, description, nullable)}
+        self.attributes = {}
+
+        # {name: nullable}
+        self.foreign_keys = {}
+
+        # the names that must be given when a resource is created
+        self.required = []
+
+        for field in meta.sorted_fields:
+            if isinstance(field, PrimaryKeyField):
+                continue
+
+            if isinstance(field, ForeignKeyField):
+                self.foreign_keys[field.name] = field.null
+
+            elif field.name not in ("id", "type"):
+                types, description = None, None
+
+                for classes, accepted, name in FIELD_TYPES:
+                    if isinstance(field, classes):
+                        types, description = accepted, name
+                        break
+
+                self.attributes[field.name] = (types, description, field.null)
+
+            if field is meta.primary_key or has_database_default(field):
+                # the key is given as the id of the resource or generated
+                continue
+
+            if not field.null and field.default is None:
+                self.required.append(field.name)
+
+        self.related = frozenset(factory.related if factory else [])
+
+    def __attributes(self, attributes):
+        for name, value in attributes.iteritems():
+            if name not in self.attributes:
+                raise JsonAPIException(
+                    "Unknown attribute '{}'.".format(name),
+                    status=400
+                )
+
+            types, description, nullable = self.attributes[name]
+
+            if value is None:
+                if not nullable:
+                    raise JsonAPIException(
+                        name + " cannot be null",
+                        status=400
+                    )
+
+            elif types and (
+                not isinstance(value, types)
+                or isinstance(value, bool) and bool not in types
+            ):
+                raise JsonAPIException(
+                    "The attribute '{}' must be {}.".format(name, description),
+                    status=400
+                )
+
+    def __relationships(self, relationships, creating):
+        for name, relationship in relationships.iteritems():
+            data = relationship.get("data")
+
+            if name in self.foreign_keys:
+                if data is None:
+                    if not self.foreign_keys[name]:
+                        raise JsonAPIException(
+                            name + " cannot be null",
+                            status=400
+                        )
+
+                elif not isinstance(data, dict):
+                    raise JsonAPIException(
+                        "The resource linkage of '{}' must be a single "
+                        "resource identifier or null.".format(name),
+                        status=400
+                    )
+
+            elif name in self.related and not creating:
+                if not isinstance(data, list):
+                    raise JsonAPIException(
+                        "The resource linkage of '{}' must be a list of "
+                        "resource identifiers.".format(name),
+                        status=400
+                    )
+
+            else:
+                raise JsonAPIException(
+                    "Encountered unknown relationship field: '{}'.".format(
+                        name
+                    ),
+                    status=400
+                )
+
+    def validate_create(self, resource):
+        """Validates the resource object of a request that creates a new
+        resource.
+        """
+
+        attributes = resource.get("attributes") or {}
+        relationships = resource.get("relationships") or {}
+
+        self.__attributes(attributes)
+        self.__relationships(relationships, creating=True)
+
+        for name in self.required:
+            if name not in attributes and name not in relationships:
+                raise JsonAPIException(name + " cannot be null", status=400)
+
+    def validate_patch(self, resource):
+        """Validates the resource object of a request that patches an
+        existing resource, which may omit any attribute and relationship.
+        """
+
+        self.__attributes(resource.get("attributes") or {})
+        self.__relationships(
+            resource.get("relationships") or {},
+            creating=False
+        )
@@ -0,0 +1,166 @@
+# coding: utf-8
+
+from peewee import ForeignKeyField, PrimaryKeyField, DateField, DateTimeField
+
+from corkscrew.handlers.util import Link, get_link_field
+
+
+class Serializer(object):
+    """A serialization plan for the rows of one model.
+
+    The plan is compiled once from the fields of the model, its registered
+    reverse relationships and its endpoint, so that serializing a row is a
+    loop over precomputed accessors instead of inspecting the model again.
+    """
+
+    def __init__(self, model, context):
+        meta = model._meta
+        factory = context.get_factory(model)
+
+        self.model = model
+        self.type = meta.name
+        self.primary_key = meta.primary_key.name
+        self.endpoint = context.get_endpoint(model)
+
+        # the path that links of this model's resources start with
+        self.path = "/" + self.endpoint.strip("/") if self.endpoint else None
+
+        # [(name, converter)]
+        self.attributes = []
+
+        # [(name, type of the referenced resource)]
+        self.foreign_keys = []
+
+        for field in meta.sorted_fields:
+            if isinstance(field, ForeignKeyField):
+                self.foreign_keys.append(
+                    (field.name, field.rel_model._meta.name)
+                )
+
+            elif isinstance(field, PrimaryKeyField):
+                continue
+
+            elif field.name not in ("id", "type"):
+                # dates are represented by their string value
+                converter = str if isinstance(
+                    field, (DateField, DateTimeField)
+                ) else None
+
+                self.attributes.append((field.name, converter))
+
+        # [(name, Link, type of the children, primary key of the children)]
+        self.related = []
+
+        if factory:
+            for name, link in factory.related.iteritems():
+                if not isinstance(link, Link):
+                    link = Link(link)
+
+                target = link.target._meta
+                self.related.append(
+                    (name, link, target.name, target.primary_key.name)
+                )
+
+    def linkage(self, entry):
+        """Returns the resource identifier object for entry."""
+
+        return {
+            u"id": unicode(entry._data.get(self.primary_key)),
+            u"type": self.type
+        }
+
+    def __select(self, compiled, fields):
+        if self.type not in fields:
+            return compiled
+
+        # the client requested certain fields only
+        return [item for item in compiled if item[0] in fields[self.type]]
+
+    def __children(self, entry, name, link, loader):
+        children = loader.get_related(entry, name) if loader else None
+
+        if children is None:
+            field = get_link_field(link, self.model)
+            key = entry._data.get(self.primary_key)
+
+            if link.via:
+                query = link.target.select().join(link.via).where(field == key)
+            else:
+                query = link.target.select().where(field == key)
+
+            children = list(query)
+
+        return children
+
+    def serialize(self, entries, base_uri, fields=None, loader=None):
+        """Returns a list of resource objects for entries.
+
+        Keyword arguments:
+        base_uri -- scheme and host that links are prefixed with
+        fields -- the parsed fields[...] query parameters
+        loader -- a corkscrew.handlers.loader.Loader with the reverse
+                  relationships of entries, they are queried per row if it
+                  is missing
+        """
+
+        fields = fields or {}
+        attributes = self.__select(self.attributes, fields)
+        foreign_keys = self.__select(self.foreign_keys, fields)
+        related = self.__select(self.related, fields)
+
+        primary_key = self.primary_key
+        resources = []
+
+        for entry in entries:
+            data = entry._data
+            key = unicode(data.get(primary_key))
+            resource = {u"id": key, u"type": self.type}
+
+            if attributes:
+                values = {}
+                for name, converter in attributes:
+                    value = data.get(name)
+
+                    if converter and value is not None:
+                        value = converter(value)
+
+                    values[name] = value
+
+                resource[u"attributes"] = values
+
+            relationships = {}
+
+            for name, target in foreign_keys:
+                value = data.get(name)
+                relationships[name] = {
+                    u"data": {
+                        u"id": unicode(value),
+                        u"type": target
+                    } if value is not None else None
+                }
+
+            for name, link, target, target_key in related:
+                children = self.__children(entry, name, link, loader)
+                relationships[name] = {
+                    u"data": [{
+                        u"id": unicode(child._data.get(target_key)),
+                        u"type": target
+                    } for child in children]
+                }
+
+            if self.path:
+                prefix = base_uri + self.path + "/" + key
+                resource[u"links"] = {u"self": prefix}
+
+                for name, relationship in relationships.iteritems():
+                    relationship[u"links"] = {
+                        u"related": prefix + "/" + name,
+                        u"self": prefix + "/relationships/" + name
+                    }
+
+            if relationships:
+                resource[u"relationships"] = relationships
+
+            resources.append(resource)
+
+        return resources
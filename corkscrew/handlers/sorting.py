@@ -0,0 +1,95 @@
+# coding: utf-8
+
+from bottle import request
+from peewee import ForeignKeyField, JOIN
+
+from corkscrew.jsonapi import JsonAPIException
+
+
+class Sort(object):
+    """Translates the sort query parameter of the current request into an
+    ORDER BY clause for a peewee query.
+
+    sort=-created,title -- descending by created, then ascending by title
+    sort=author.name -- by an attribute of a forward relationship, the
+                        related table is joined for this
+
+    Only the keys that were whitelisted with the sortable argument of
+    CorkscrewApplication.register() may be used.
+    """
+
+    def __init__(self, model, sortable=None):
+        self.model = model
+        self.keys = []
+
+        sortable = sortable or []
+
+        for key in request.query.sort.split(","):
+            if not key:
+                continue
+
+            descending = key.startswith("-")
+            name = key[1:] if descending else key
+
+            if name not in sortable:
+                raise JsonAPIException(
+                    "Sorting by '{}' is not allowed.".format(name),
+                    status=400
+                )
+
+            self.keys.append((name.split("."), descending))
+
+    @staticmethod
+    def __field(model, name):
+        # joined tables are model aliases, their fields are proxies
+        model = getattr(model, "model_class", model)
+        return model._meta.fields.get(name)
+
+    def apply(self, query):
+        """Adds the joins that are needed for sorting to query and returns
+        the new query together with the list of ORDER BY expressions.
+        """
+
+        ordering = []
+        joins = {}
+
+        for path, descending in self.keys:
+            model = self.model
+
+            for i, name in enumerate(path[:-1]):
+                field = self.__field(model, name)
+
+                if not isinstance(field, ForeignKeyField):
+                    raise JsonAPIException(
+                        "Cannot sort by '{}'.".format(".".join(path)),
+                        status=400
+                    )
+
+                prefix = tuple(path[:i + 1])
+
+                if prefix not in joins:
+                    # aliases keep joins of the same table apart
+                    alias = field.rel_model.alias()
+                    query = query.switch(model).join(
+                        alias,
+                        JOIN.LEFT_OUTER,
+                        on=(
+                            getattr(model, name)
+                            == getattr(alias, field.to_field.name)
+                        )
+                    )
+
+                    joins[prefix] = alias
+
+                model = joins[prefix]
+
+            if self.__field(model, path[-1]) is None:
+                raise JsonAPIException(
+                    "Cannot sort by '{}'.".format(".".join(path)),
+                    status=400
+                )
+
+            field = getattr(model, path[-1])
+            ordering.append(field.desc() if descending else field.asc())
+
+        return query, ordering
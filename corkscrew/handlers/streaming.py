@@ -0,0 +1,94 @@
+# coding: utf-8
+
+from tempfile import SpooledTemporaryFile
+
+
+# the number of rows that are serialized together
+STREAM_CHUNK_SIZE = 100
+
+# included resources are buffered in memory up to this size (in bytes) and
+# spill over to a temporary file beyond it
+STREAM_SPOOL_SIZE = 1024 * 1024
+
+
+def chunks(iterable, size=STREAM_CHUNK_SIZE):
+    """Splits iterable into lists of at most size elements."""
+
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+
+    if chunk:
+        yield chunk
+
+
+def stream_document(resources, finish, encoder):
+    """Encodes a collection document incrementally.
+
+    Keyword arguments:
+    resources -- an iterable of (data, included) tuples, one per chunk
+    finish -- a function that is called once all resources were written and
+              returns the remaining top-level members of the document (like
+              links and meta) as a dictionary
+    encoder -- a corkscrew.encoders.JsonEncoder instance
+
+    The elements of the data array are written as soon as their chunk has been
+    serialized. Included resources are deduplicated by type and id and kept
+    in a spooled buffer until the data array is complete, so that memory
+    usage does not depend on the size of the collection.
+    """
+
+    primary = set()
+    seen = set()
+    spool = SpooledTemporaryFile(STREAM_SPOOL_SIZE)
+
+    try:
+        yield '{"data": ['
+
+        separator = ""
+        for data, included in resources:
+            for resource in data:
+                resource = dict(resource)
+                primary.add((resource.get("type"), resource.get("id")))
+
+                yield separator + encoder.dumps(resource)
+                separator = ", "
+
+            for resource in included:
+                resource = dict(resource)
+                key = (resource.get("type"), resource.get("id"))
+
+                if key not in seen:
+                    seen.add(key)
+                    # JSON never contains a literal tab, so it can be used to
+                    # separate the key from the encoded resource
+                    spool.write("{}\t{}\n".format(
+                        encoder.dumps(key),
+                        encoder.dumps(resource)
+                    ))
+
+        yield "]"
+
+        spool.seek(0)
+        separator = ', "included": ['
+        for line in spool:
+            key, encoded = line.rstrip("\n").split("\t", 1)
+
+            if tuple(encoder.loads(key)) not in primary:
+                yield separator + encoded
+                separator = ", "
+
+        if separator == ", ":
+            yield "]"
+
+        for name, value in sorted(finish().iteritems()):
+            yield ', "{}": {}'.format(name, encoder.dumps(value))
+
+        yield "}"
+
+    finally:
+        spool.close()
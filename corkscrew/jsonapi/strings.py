@@ -43,10 +43,14 @@ class M:
     NAMES_MUST_USE_ALLOWED_CHARS = "Member names MUST contain only the allowed characters."
     NO_ADDITIONAL_MEMBERS = "objects defined by this specification MUST NOT contain any additional members"
     ONLY_ALLOWED_CHARS = "Member names MUST contain only the allowed characters."
+    OPERATION_MUST_BE_OBJECT = "An operation MUST be an object."
+    OPERATIONS_MUST_BE_ARRAY = "The request MUST include an array of operation objects in atomic:operations."
     PRIMARY_MUST_BE_OBJECT = "The request MUST include a single resource object as primary data."
     REL_WITH_NO_DATA_MEMBER = "If a relationship is provided in the relationships member of the resource object, its value MUST be a relationship object with a data member."
+    REQ_MUST_BE_ARRAY = "The request MUST include an array of resource objects as primary data."
     REQ_MUST_BE_SINGLE_OBJECT = "The request MUST include a single resource object as primary data."
     RESERVED_RELATIONSHIP = "The name 'relationships' is reserved for future use."
     RESERVED_LINKS = "The name 'links' is reserved for future use."
     TYPE_AND_ID_REQUIRED = "The resource object MUST contain type and id members."
     TYPE_REQUIRED = "A resource object MUST contain at least the following top-level member: type."
+    UNSUPPORTED_OPERATION = "The operation '{}' is not supported for this target."
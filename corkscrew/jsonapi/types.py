@@ -1,5 +1,7 @@
 # coding: utf-8
 
+from collections import OrderedDict
+
 
 def urljoin(*parts):
     return "/".join(part.strip("/") for part in parts)
@@ -38,20 +40,30 @@ class JsonAPIResponse(JsonAPIBase):
             return
 
         if isinstance(self.data, list):
-            yield ("data", [dict(d) for d in self.data])
+            data = [dict(d) for d in self.data]
+            yield ("data", data)
         elif self.data is None:
+            data = []
             yield ("data", None)
         else:
-            yield ("data", dict(self.data))
+            data = [dict(self.data)]
+            yield ("data", data[0])
 
         if self.included:
-            included = []
+            # resources are identified by type and id, a compound document
+            # must not contain the same resource twice
+            primary = set((d.get("type"), d.get("id")) for d in data)
+            included = OrderedDict()
+
             for inc in self.included:
                 i = dict(inc)
-                if i not in included:
-                    included.append(i)
+                key = (i.get("type"), i.get("id"))
+
+                if key not in primary and key not in included:
+                    included[key] = i
 
-            yield ("included", included)
+            if included:
+                yield ("included", included.values())
 
         if not ((hasattr(self, "meta") and self.meta) or hasattr(self, "data")
                 or self.errors):
@@ -8,6 +8,62 @@ from corkscrew.jsonapi import JsonAPIException
 from corkscrew.jsonapi.strings import M
 
 
+# a member name that consists of allowed characters only, characters beyond
+# the basic multilingual plane are left to the character by character check
+MEMBER_NAME = re.compile(
+    u"^[0-9A-Za-z\x80-\uffff]"
+    u"(?:[0-9A-Za-z\\-_ \x80-\uffff]*[0-9A-Za-z\x80-\uffff])?\\Z"
+)
+
+# the same for byte strings, which may only contain ASCII characters
+ASCII_MEMBER_NAME = re.compile(
+    r"^[0-9A-Za-z](?:[0-9A-Za-z\-_ ]*[0-9A-Za-z])?\Z"
+)
+
+ALLOWED_CHAR = re.compile(r"^[0-9A-Za-z]$")
+ALLOWED_MIDDLE_CHAR = re.compile(r"^[0-9A-Za-z\-_ ]$")
+
+TOPLEVEL_MEMBERS = frozenset(
+    ["data", "errors", "meta", "links", "jsonapi", "included"]
+)
+JSONAPI_MEMBERS = frozenset(["version", "meta"])
+LINK_MEMBERS = frozenset(["href", "meta"])
+RESOURCE_MEMBERS = frozenset(
+    ["id", "type", "attributes", "relationships", "links", "meta"]
+)
+RELATIONSHIP_MEMBERS = frozenset(["links", "data", "meta"])
+IDENTIFIER_MEMBERS = frozenset(["type", "id"])
+ERROR_MEMBERS = frozenset(
+    ["id", "links", "status", "code", "title", "detail", "source", "meta"]
+)
+SOURCE_MEMBERS = frozenset(["pointer", "parameter"])
+
+
+def validate_member_name(key):
+    """Validates a single member name character by character, which finds
+    the first offending character.
+    """
+
+    assert len(key) > 0, M.AT_LEAST_ONE_CHAR
+
+    is_allowed_char = ALLOWED_CHAR.match(key[0])
+    is_other_char = ord(unicode(key[0])) > 0x7F
+
+    assert is_allowed_char or is_other_char, M.ONLY_ALLOWED_CHARS
+
+    if len(key) > 2:
+        for character in key[1:-1]:
+            is_allowed_char = ALLOWED_MIDDLE_CHAR.match(character)
+            is_other_char = ord(unicode(character)) > 0x7F
+            assert (
+                is_allowed_char or is_other_char
+            ), M.NAMES_MUST_USE_ALLOWED_CHARS
+
+    assert (
+        ALLOWED_CHAR.match(key[-1:]) or ord(unicode(key[-1:])) > 0x7F
+    ), M.NAMES_MUST_END_WITH_ALLOWED
+
+
 class JsonAPIValidator(object):
     """A collection of functions that validates JsonAPI structures."""
 
@@ -40,14 +96,37 @@ class JsonAPIValidator(object):
         if not isinstance(doc["data"], dict):
             raise JsonAPIException(M.REQ_MUST_BE_SINGLE_OBJECT)
 
-        if "type" not in doc["data"]:
+        JsonAPIValidator.validate_create_resource(doc["data"], _type)
+
+    @staticmethod
+    def validate_bulk_create(doc, _type):
+        """Validates a JsonAPI structure that can be used for creating several
+        resources at once (bulk extension).
+        """
+
+        JsonAPIValidator.validate(doc, is_client_generated=True)
+
+        if not isinstance(doc.get("data"), list):
+            raise JsonAPIException(M.REQ_MUST_BE_ARRAY)
+
+        for resource in doc["data"]:
+            JsonAPIValidator.validate_create_resource(resource, _type)
+
+    @staticmethod
+    def validate_create_resource(resource, _type):
+        """Validates a resource object that is going to be created."""
+
+        if "type" not in resource:
             raise JsonAPIException(M.MUST_CONTAIN_TYPE)
 
-        if not _type == doc["data"]["type"]:
-            JsonAPIException(M.ILLEGAL_TYPE.format(doc["data"]["type"]))
+        if not _type == resource["type"]:
+            raise JsonAPIException(
+                M.ILLEGAL_TYPE.format(resource["type"]),
+                status=409
+            )
 
-        if "relationships" in doc["data"]:
-            for _, data in doc["data"]["relationships"].iteritems():
+        if "relationships" in resource:
+            for _, data in resource["relationships"].iteritems():
                 if "id" not in data["data"]:
                     raise JsonAPIException(M.REL_WITH_NO_DATA_MEMBER)
 
@@ -80,6 +159,27 @@ class JsonAPIValidator(object):
         if not doc["data"]["id"] == _id:
             JsonAPIException(M.ID_REQUEST_URI_MISMATCH)
 
+    @staticmethod
+    def validate_bulk_patch(doc, _type):
+        """Validates a JsonAPI structure that can be used for patching or
+        deleting several resources at once (bulk extension).
+        """
+
+        JsonAPIValidator.validate(doc)
+
+        if not isinstance(doc.get("data"), list):
+            raise JsonAPIException(M.REQ_MUST_BE_ARRAY)
+
+        for resource in doc["data"]:
+            if "type" not in resource or "id" not in resource:
+                raise JsonAPIException(M.TYPE_AND_ID_REQUIRED)
+
+            if not _type == resource["type"]:
+                raise JsonAPIException(
+                    M.ILLEGAL_TYPE_PATCH.format(resource["type"]),
+                    status=409
+                )
+
     @staticmethod
     def validate_content_type(content_type):
         """Validates the Content-Type of a response."""
@@ -91,31 +191,33 @@ class JsonAPIValidator(object):
     def validate_member_names(doc):
         """Validates the characters used in member names against the JSON API
         specification.
-        """
 
-        for key, value in doc.iteritems():
-            assert len(key) > 0, M.AT_LEAST_ONE_CHAR
+        Nested objects are visited depth first without recursion. Each name
+        is matched against a single precompiled pattern and only checked
+        character by character if that fails.
+        """
 
-            is_allowed_char = re.match(r"^[0-9A-Za-z]$", key[0])
-            is_other_char = ord(unicode(key[0])) > 0x7F
+        seen = set()
+        stack = [doc.iteritems()]
 
-            assert is_allowed_char or is_other_char, M.ONLY_ALLOWED_CHARS
+        while stack:
+            for key, value in stack[-1]:
+                if key not in seen:
+                    pattern = MEMBER_NAME if isinstance(key, unicode) else (
+                        ASCII_MEMBER_NAME
+                    )
 
-            if len(key) > 2:
-                for character in key[1:-1]:
-                    is_allowed_char = re.match(r"^[0-9A-Za-z\-_ ]$", character)
-                    is_other_char = ord(unicode(character)) > 0x7F
-                    assert (
-                        is_allowed_char or is_other_char
-                    ), M.NAMES_MUST_USE_ALLOWED_CHARS
+                    if pattern.match(key):
+                        seen.add(key)
+                    else:
+                        validate_member_name(key)
 
-            assert (
-                re.match(r"^[0-9A-Za-z]$", key[-1:])
-                or ord(unicode(key[-1:])) > 0x7F
-            ), M.NAMES_MUST_END_WITH_ALLOWED
+                if isinstance(value, dict):
+                    stack.append(value.iteritems())
+                    break
 
-            if isinstance(value, dict):
-                JsonAPIValidator.validate_member_names(value)
+            else:
+                stack.pop()
 
     @staticmethod
     def validate_jsonapi(doc, is_client_generated=False):
@@ -132,15 +234,7 @@ class JsonAPIValidator(object):
             not ("data" in doc and "errors" in doc)
         ), M.DATA_AND_ERROR_MUST_NOT_COEXIST
 
-        for key in doc.keys():
-            assert key in [
-                "data",
-                "errors",
-                "meta",
-                "links",
-                "jsonapi",
-                "included"
-            ], M.NO_ADDITIONAL_MEMBERS
+        assert TOPLEVEL_MEMBERS.issuperset(doc), M.NO_ADDITIONAL_MEMBERS
 
         if "data" in doc:
             assert (
@@ -149,11 +243,10 @@ class JsonAPIValidator(object):
             ), M.ILLEGAL_DATA_VALUE
 
             if isinstance(doc["data"], list):
+                validate = JsonAPIValidator.validate_resource
+
                 for res in doc["data"]:
-                    JsonAPIValidator.validate_resource(
-                        res,
-                        is_client_generated
-                    )
+                    validate(res, is_client_generated)
 
             elif isinstance(doc["data"], dict):
                 JsonAPIValidator.validate_resource(
@@ -174,8 +267,7 @@ class JsonAPIValidator(object):
 
         if "jsonapi" in doc:
             assert isinstance(doc["jsonapi"], dict), M.ILLEGAL_JSONAPI
-            for key in doc["jsonapi"].keys():
-                assert key in ["version", "meta"]
+            assert JSONAPI_MEMBERS.issuperset(doc["jsonapi"])
 
             if "meta" in doc["jsonapi"]:
                 assert isinstance(doc["jsonapi"]["meta"], dict), M.ILLEGAL_META
@@ -206,8 +298,7 @@ class JsonAPIValidator(object):
             if isinstance(link, unicode):
                 assert urlparse(link), M.INVALID_LINK
             else:
-                for key in link.keys():
-                    assert key in ["href", "meta"], M.NO_ADDITIONAL_MEMBERS
+                assert LINK_MEMBERS.issuperset(link), M.NO_ADDITIONAL_MEMBERS
 
                 if "href" in link:
                     assert urlparse(link["href"]), M.INVALID_LINK
@@ -220,15 +311,7 @@ class JsonAPIValidator(object):
         assert "type" in resource, M.TYPE_REQUIRED
         assert isinstance(resource["type"], unicode), M.ILLEGAL_TYPE_VALUE
 
-        for key in resource.keys():
-            assert key in [
-                "id",
-                "type",
-                "attributes",
-                "relationships",
-                "links",
-                "meta"
-            ], M.NO_ADDITIONAL_MEMBERS
+        assert RESOURCE_MEMBERS.issuperset(resource), M.NO_ADDITIONAL_MEMBERS
 
         if not is_client_generated:
             assert "id" in resource, M.ID_REQUIRED
@@ -266,15 +349,13 @@ class JsonAPIValidator(object):
 
         assert isinstance(attributes, dict), M.ILLEGAL_ATTRIBUTES
 
-        for key, value in attributes.iteritems():
-            assert key != "id", M.ATTRIBUTE_ID_FORBIDDEN
-            assert key != "type", M.ATTRIBUTE_TYPE_FORBIDDEN
+        assert "id" not in attributes, M.ATTRIBUTE_ID_FORBIDDEN
+        assert "type" not in attributes, M.ATTRIBUTE_TYPE_FORBIDDEN
 
+        for key, value in attributes.iteritems():
             if isinstance(value, dict):
-                assert "links" not in value.keys(), M.RESERVED_LINKS
-                assert (
-                    "relationships" not in value.keys()
-                ), M.RESERVED_RELATIONSHIP
+                assert "links" not in value, M.RESERVED_LINKS
+                assert "relationships" not in value, M.RESERVED_RELATIONSHIP
 
             if key.endswith("_id"):
                 logging.warn(M.FOREIGN_KEYS_SHOULD_BE_ATTRIBUTES)
@@ -285,19 +366,43 @@ class JsonAPIValidator(object):
 
         assert isinstance(relationships, dict), M.ILLEGAL_RELATIONSHIPS
 
-        for key, relationship in relationships.iteritems():
+        validate = JsonAPIValidator.validate_resource_identifier
+
+        for relationship in relationships.itervalues():
+            if (
+                isinstance(relationship, dict) and len(relationship) == 1
+                and "data" in relationship
+            ):
+                # fast path for the linkage of requests, identifiers with
+                # exactly a type and an id need no further checks
+                data = relationship["data"]
+
+                if isinstance(data, list):
+                    for identifier in data:
+                        if not (
+                            isinstance(identifier, dict)
+                            and len(identifier) == 2
+                            and "type" in identifier and "id" in identifier
+                        ):
+                            validate(identifier)
+
+                    continue
+
+                if data is None or (
+                    isinstance(data, dict) and len(data) == 2
+                    and "type" in data and "id" in data
+                ):
+                    continue
+
             assert isinstance(relationship, dict), M.ILLEGAL_RELATIONSHIP_VALUE
             assert (
                 "links" in relationship or "data" in relationship
                 or "meta" in relationship
             ), M.INVALID_RELATIONSHIP_FIELDS
 
-            for key in relationship.keys():
-                assert key in [
-                    "links",
-                    "data",
-                    "meta"
-                ], M.NO_ADDITIONAL_MEMBERS
+            assert (
+                RELATIONSHIP_MEMBERS.issuperset(relationship)
+            ), M.NO_ADDITIONAL_MEMBERS
 
             if "links" in relationship:
                 assert (
@@ -308,20 +413,18 @@ class JsonAPIValidator(object):
                 JsonAPIValidator.validate_links(relationship["links"])
 
             if "data" in relationship:
+                data = relationship["data"]
+
                 assert (
-                    relationship["data"] is None
-                    or isinstance(relationship["data"], list)
-                    or isinstance(relationship["data"], dict)
+                    data is None or isinstance(data, (list, dict))
                 ), M.INVALID_LINKAGE_ATTRIBUTES
 
-                if isinstance(relationship["data"], list):
-                    for res in relationship["data"]:
-                        JsonAPIValidator.validate_resource_identifier(res)
+                if isinstance(data, list):
+                    for res in data:
+                        validate(res)
 
-                elif isinstance(relationship["data"], dict):
-                    JsonAPIValidator.validate_resource_identifier(
-                        relationship["data"]
-                    )
+                elif isinstance(data, dict):
+                    validate(data)
 
     @staticmethod
     def validate_resource_identifier(identifier):
@@ -331,8 +434,7 @@ class JsonAPIValidator(object):
         assert "type" in identifier, M.LINKAGE_TYPE_ID_REQUIRED
         assert "id" in identifier, M.LINKAGE_TYPE_ID_REQUIRED
 
-        for key in identifier.keys():
-            assert key in ["type", "id"]
+        assert IDENTIFIER_MEMBERS.issuperset(identifier)
 
     @staticmethod
     def validate_error(error):
@@ -340,17 +442,7 @@ class JsonAPIValidator(object):
 
         assert isinstance(error, dict), "An error must be an object."
 
-        for key in error.keys():
-            assert key in [
-                "id",
-                "links",
-                "status",
-                "code",
-                "title",
-                "detail",
-                "source",
-                "meta"
-            ], M.NO_ADDITIONAL_MEMBERS
+        assert ERROR_MEMBERS.issuperset(error), M.NO_ADDITIONAL_MEMBERS
 
         if "links" in error:
             JsonAPIValidator.validate_links(error["links"], fields=["about"])
@@ -363,8 +455,9 @@ class JsonAPIValidator(object):
 
         if "source" in error:
             assert isinstance(error["source"], dict), M.ILLEGAL_SOURCE
-            for key in error["source"].keys():
-                assert key in ["pointer", "parameter"], M.NO_ADDITIONAL_MEMBERS
+            assert (
+                SOURCE_MEMBERS.issuperset(error["source"])
+            ), M.NO_ADDITIONAL_MEMBERS
 
         if "meta" in error:
             assert isinstance(error["meta"], dict), M.ILLEGAL_META
@@ -1,39 +1,94 @@
 # coding: utf-8
 
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
 import unittest
 import warnings
 
 from webtest import TestApp
-from peewee import SqliteDatabase
+from peewee import SqliteDatabase, CharField, IntegerField, DateTimeField, SQL
+from playhouse.pool import PooledSqliteDatabase
 
 from corkscrew import CorkscrewApplication, Link
+from corkscrew.cache import ResourceCache, MemoryBackend, SqliteBackend
+from corkscrew.cache import MemcachedBackend
+from corkscrew.connections import ConnectionManager
+from corkscrew.encoders import available_encoders
 from corkscrew.jsonapi import JsonAPIValidator
-from corkscrew.handlers import PeeweeHandlerFactory as PHF
+from corkscrew.jsonapi.strings import M
+from corkscrew.handlers import PeeweeHandlerFactory as PHF, Listener
+from corkscrew.handlers import util
+from corkscrew.handlers.counting import estimate
+from corkscrew.handlers.loader import Loader
 from corkscrew.fixtures import insertFixtures, database
 from corkscrew.fixtures import Comment, Person, Photo, Article, Tag, PhotoTag
-from corkscrew.fixtures import Revision
+from corkscrew.fixtures import Revision, BaseModel
 from corkscrew.fixtures import ARTICLE_TITLES, COMMENT_BODIES, TAG_NAMES
 
 
+class CountingSqliteDatabase(SqliteDatabase):
+    """A SqliteDatabase that counts the statements it executes."""
+
+    queries = 0
+
+    def execute_sql(self, *args, **kwargs):
+        CountingSqliteDatabase.queries += 1
+        return super(CountingSqliteDatabase, self).execute_sql(*args, **kwargs)
+
+
+class Setting(BaseModel):
+    """A model with a client generated key and database defaults."""
+
+    key = CharField(primary_key=True)
+    value = CharField()
+    flag = IntegerField(constraints=[SQL("DEFAULT 7")])
+    created = DateTimeField(
+        null=True,
+        constraints=[SQL("DEFAULT CURRENT_TIMESTAMP")]
+    )
+
+
 class TestCorkscrew(unittest.TestCase):
 
     def setUp(self):
-        database.initialize(SqliteDatabase(":memory:"))
+        database.initialize(CountingSqliteDatabase(":memory:"))
         insertFixtures()
 
-        app = CorkscrewApplication(PHF)
-        app.register(Comment, endpoint="/comments")
+        self.app = self.createApp()
+
+    def createApp(self, encoder=None, cache=None, connections=None,
+                  **options):
+        app = CorkscrewApplication(
+            PHF,
+            encoder=encoder,
+            cache=cache,
+            connections=connections
+        )
+        app.register(
+            Comment,
+            endpoint="/comments",
+            filterable=["author"],
+            sortable=["body", "author.name", "article.author.name"],
+            **options
+        )
 
         app.register(
             Person,
             related={"articles": Article},
-            endpoint="/people"
+            endpoint="/people",
+            filterable=["name", "age"],
+            sortable=["name", "age"],
+            **options
         )
 
         app.register(
             Photo,
             related={"tags": Link(Tag, via=PhotoTag)},
-            endpoint="/photos"
+            endpoint="/photos",
+            **options
         )
 
         app.register(
@@ -42,10 +97,13 @@ class TestCorkscrew(unittest.TestCase):
                 "comments": Comment,
                 "revisions": Link(Revision, on="parent")
             },
-            endpoint="/articles"
+            endpoint="/articles",
+            filterable=["title", "author"],
+            sortable=["title", "created", "author.name"],
+            **options
         )
 
-        self.app = TestApp(app)
+        return TestApp(app)
 
     def tearDown(self):
         database.close()
@@ -280,6 +338,871 @@ class TestCorkscrew(unittest.TestCase):
 
         self.assertIs(len(result.json["data"]), 0)
 
+    def testPageBasedPagination(self):
+        result = self.app.get("/articles?page[size]=1")
+        JsonAPIValidator.validate(result.json)
+
+        self.assertIs(len(result.json["data"]), 1)
+        self.assertEqual(result.json["data"][0]["id"], "1")
+        self.assertNotIn("prev", result.json["links"])
+        self.assertIn("first", result.json["links"])
+        self.assertIn("last", result.json["links"])
+
+        result = self.app.get(result.json["links"]["next"])
+        JsonAPIValidator.validate(result.json)
+
+        self.assertIs(len(result.json["data"]), 1)
+        self.assertEqual(result.json["data"][0]["id"], "2")
+        self.assertIn("prev", result.json["links"])
+        self.assertNotIn("next", result.json["links"])
+        self.assertEqual(
+            result.json["links"]["self"],
+            result.json["links"]["last"]
+        )
+
+    def testCursorPagination(self):
+        result = self.app.get("/articles?page[cursor]=&page[size]=1")
+        JsonAPIValidator.validate(result.json)
+
+        self.assertIs(len(result.json["data"]), 1)
+        self.assertEqual(result.json["data"][0]["id"], "1")
+
+        result = self.app.get(result.json["links"]["next"])
+        self.assertIs(len(result.json["data"]), 1)
+        self.assertEqual(result.json["data"][0]["id"], "2")
+        self.assertNotIn("next", result.json["links"])
+
+    def testPaginationWithInvalidParameters(self):
+        self.app.get("/articles?page[size]=0", status=400)
+        self.app.get("/articles?page[number]=first", status=400)
+
+    def countQueries(self, url, cached_counts=False):
+        if not cached_counts and self.app.app.counts is not None:
+            # rows that are created directly do not invalidate counts
+            self.app.app.counts.clear()
+
+        CountingSqliteDatabase.queries = 0
+        self.app.get(url)
+        return CountingSqliteDatabase.queries
+
+    def testForwardRelationshipsAreLoadedInBatches(self):
+        url = "/comments?include=author"
+        queries = self.countQueries(url)
+
+        for i in xrange(10):
+            Comment.create(body="Comment " + str(i), author=i % 2 + 1)
+
+        self.assertEqual(self.countQueries(url), queries)
+
+        result = self.app.get(url)
+        self.assertIs(len(result.json["included"]), 2)
+
+    def testReverseRelationshipsAreLoadedInBatches(self):
+        articles = self.countQueries("/articles")
+        photos = self.countQueries("/photos")
+
+        for i in xrange(10):
+            article = Article.create(title="Article " + str(i), author=1)
+            Comment.create(body="Comment", article=article, author=2)
+
+            photo = Photo.create(title="Photo", src="", photographer=2)
+            PhotoTag.create(photo=photo, tag=i % 2 + 1)
+
+        self.assertEqual(self.countQueries("/articles"), articles)
+        self.assertEqual(self.countQueries("/photos"), photos)
+
+        result = self.app.get("/photos")
+        for photo in result.json["data"]:
+            self.assertIn(len(photo["relationships"]["tags"]["data"]), [1, 2])
+
+    def testLoaderSplitsLargeKeySetsIntoBatches(self):
+        loader = Loader(None)
+        keys = range(1, 2001)
+
+        CountingSqliteDatabase.queries = 0
+        people = loader.load(Comment.author, keys)
+
+        # 998 keys per IN (...) expression
+        self.assertEqual(CountingSqliteDatabase.queries, 3)
+        self.assertEqual(len(people), Person.select().count())
+
+        CountingSqliteDatabase.queries = 0
+        articles = loader.load_related(
+            [Person(id=key) for key in keys],
+            "articles",
+            Link(Article)
+        )
+
+        self.assertEqual(CountingSqliteDatabase.queries, 3)
+        self.assertEqual(len(articles), Article.select().count())
+
+    def testNestedIncludesAreLoadedInBatches(self):
+        url = "/articles?include=comments.author,author.articles"
+        queries = self.countQueries(url)
+
+        for i in xrange(10):
+            article = Article.create(title="Article " + str(i), author=2)
+            Comment.create(body="Comment", article=article, author=i % 2 + 1)
+
+        self.assertLessEqual(self.countQueries(url), queries)
+
+        result = self.app.get(url)
+        keys = [(inc["type"], inc["id"]) for inc in result.json["included"]]
+        self.assertEqual(len(keys), len(set(keys)))
+        self.assertIn(("person", "1"), keys)
+        self.assertIn(("person", "2"), keys)
+
+    def testLinkWithSpecifiedFieldLinkage(self):
+        result = self.app.get("/articles/1")
+        revisions = result.json["data"]["relationships"]["revisions"]["data"]
+        self.assertEqual(revisions, [{"id": "1", "type": "revision"}])
+
+    def testStreamingResponses(self):
+        streaming = self.createApp(streaming=True)
+
+        for url in [
+            "/articles",
+            "/articles?include=comments.author,author&page[size]=1",
+            "/articles?fields[article]=title&page[cursor]=",
+            "/articles/1/comments?include=article",
+            "/articles?include=comments.article",
+            "/articles/1/relationships/comments",
+            "/photos/1/tags"
+        ]:
+            expected = self.app.get(url)
+            result = streaming.get(url)
+
+            JsonAPIValidator.validate(result.json)
+            self.assertEqual(result.json, expected.json)
+            self.assertEqual(result.body, expected.body)
+
+        # errors of the first query are reported before anything is sent
+        result = streaming.get("/people?filter[age]=abc", status=400)
+        JsonAPIValidator.validate(result.json)
+        self.assertIn("errors", result.json)
+
+    def testConnectionPool(self):
+        directory = tempfile.mkdtemp()
+        pool = PooledSqliteDatabase(
+            os.path.join(directory, "pool.db"),
+            max_connections=8,
+            check_same_thread=False
+        )
+
+        try:
+            database.initialize(pool)
+            insertFixtures()
+            pool.close()
+
+            connections = ConnectionManager(
+                database,
+                max_connections=1,
+                stale_timeout=300,
+                timeout=0.05
+            )
+            app = self.createApp(connections=connections, streaming=True)
+
+            for _ in xrange(3):
+                result = app.get("/articles")
+                self.assertIs(len(result.json["data"]), len(ARTICLE_TITLES))
+
+            app.delete("/comments/1", status=204)
+
+            # the pool is configured and the connection is reused
+            self.assertEqual(pool.max_connections, 1)
+            self.assertEqual(pool.stale_timeout, 300)
+
+            stats = connections.stats()
+            self.assertEqual(stats["checkouts"], 4)
+            self.assertEqual(stats["in_use"], 0)
+            self.assertEqual(stats["idle"], 1)
+            self.assertEqual(stats["timeouts"], 0)
+
+            # another thread holds the only connection
+            held = threading.Event()
+            done = threading.Event()
+
+            def worker():
+                connections.checkout()
+                held.set()
+                done.wait()
+                connections.release()
+
+            thread = threading.Thread(target=worker)
+            thread.start()
+            held.wait()
+
+            try:
+                app.get("/articles", status=503)
+                self.assertEqual(connections.stats()["timeouts"], 1)
+
+            finally:
+                done.set()
+                thread.join()
+
+            app.get("/articles")
+            self.assertEqual(connections.stats()["in_use"], 0)
+
+        finally:
+            pool.close_all()
+            shutil.rmtree(directory)
+
+    def testTotals(self):
+        app = self.createApp(total="exact")
+
+        for url, total in [
+            ("/articles", 2),
+            ("/articles?page[size]=1&page[number]=2", 2),
+            ("/articles?page[cursor]=", 2),
+            ("/people?filter[age][gt]=18", 1),
+            ("/articles/1/comments", 2),
+            ("/articles/2/comments", 0)
+        ]:
+            result = app.get(url)
+            JsonAPIValidator.validate(result.json)
+            self.assertEqual(result.json["meta"], {"total": total})
+
+        self.assertNotIn("meta", self.app.get("/articles").json)
+
+        # counts are cached per filter signature
+        CountingSqliteDatabase.queries = 0
+        app.get("/people?filter[age][gt]=18")
+        cached = CountingSqliteDatabase.queries
+
+        CountingSqliteDatabase.queries = 0
+        app.get("/people?filter[age][gt]=19")
+        self.assertEqual(CountingSqliteDatabase.queries, cached + 1)
+
+        # and invalidated by writes
+        app.post_json("/comments", params={
+            u"data": {
+                u"type": u"comment",
+                u"attributes": {u"body": u"Meh."},
+                u"relationships": {
+                    u"article": {u"data": {u"type": u"article", u"id": u"1"}},
+                    u"author": {u"data": {u"type": u"person", u"id": u"1"}}
+                }
+            }
+        })
+
+        result = app.get("/articles/1/comments")
+        self.assertEqual(result.json["meta"], {"total": 3})
+
+        app.delete("/articles/2")
+        self.assertEqual(app.get("/articles").json["meta"], {"total": 1})
+
+        streaming = self.createApp(total="exact", streaming=True)
+        for url in ["/articles", "/articles/1/comments?page[cursor]="]:
+            expected = app.get(url)
+            self.assertEqual(streaming.get(url).body, expected.body)
+
+    def testNoInvalidationsWithoutCaching(self):
+        for i in xrange(50):
+            self.app.post_json("/people", params={u"data": {
+                u"type": u"person",
+                u"attributes": {u"name": u"Person " + str(i), u"age": i}
+            }})
+
+        # neither documents nor counts are cached
+        self.assertIsNone(self.app.app.counts)
+        self.assertIsNone(self.app.app.context.counts)
+
+        # pagination links count once per filter signature without total
+        url = "/articles?page[size]=1"
+        queries = self.countQueries(url)
+        self.assertIsNotNone(self.app.app.counts)
+        self.assertEqual(self.countQueries(url, True), queries - 1)
+
+        result = self.app.get("/articles?page[size]=1")
+        self.assertIn("page%5Bnumber%5D=2", result.json["links"]["last"])
+        self.assertNotIn("meta", result.json)
+
+    def testEstimatedTotals(self):
+        # SQLite keeps no statistics, so estimated totals are exact
+        self.assertIsNone(estimate(Article))
+
+        app = self.createApp(total="estimated")
+        result = app.get("/articles")
+        self.assertEqual(result.json["meta"], {"total": 2})
+
+    def testEncoders(self):
+        expected = self.app.get("/articles?include=comments")
+
+        request = {
+            u"data": {
+                u"type": u"person",
+                u"attributes": {u"name": u"J\xf6rg", u"age": 30}
+            }
+        }
+
+        for encoder in available_encoders():
+            app = self.createApp(encoder=encoder(sort_keys=False))
+
+            result = app.get("/articles?include=comments")
+            self.assertEqual(result.json, expected.json)
+
+            result = app.post_json("/people", params=request)
+            JsonAPIValidator.validate(result.json)
+            self.assertEqual(
+                result.json["data"]["attributes"]["name"],
+                u"J\xf6rg"
+            )
+
+            app.post("/people", "{invalid", status=400)
+            app.get("/people/1337", status=404)
+
+    def testSerializerIsCompiledAtRegistration(self):
+        app = CorkscrewApplication(PHF)
+        app.register(Article, related={"comments": Comment})
+
+        serializer = app.context.serializers[Article]
+        self.assertIs(app.context.get_serializer(Article), serializer)
+        self.assertEqual(serializer.path, "/article")
+        self.assertEqual(
+            [name for name, _ in serializer.attributes],
+            ["title", "created"]
+        )
+        self.assertEqual(
+            serializer.foreign_keys,
+            [("cover", "photo"), ("author", "person")]
+        )
+        self.assertEqual(
+            [name for name, _, _, _ in serializer.related],
+            ["comments"]
+        )
+
+    def testFiltering(self):
+        result = self.app.get("/people?filter[age][gt]=18")
+        JsonAPIValidator.validate(result.json)
+        self.assertEqual([r["id"] for r in result.json["data"]], ["2"])
+
+        result = self.app.get(
+            "/people?filter[age][gte]=18&filter[name]=Jane Doe"
+        )
+        self.assertEqual([r["id"] for r in result.json["data"]], ["2"])
+
+        result = self.app.get("/articles?filter[author]=1")
+        self.assertIs(len(result.json["data"]), 2)
+
+        result = self.app.get("/articles?filter[author]=2")
+        self.assertIs(len(result.json["data"]), 0)
+
+        result = self.app.get(
+            "/articles?filter[title]=" + ",".join(ARTICLE_TITLES[:1] + ["x"])
+        )
+        self.assertEqual([r["id"] for r in result.json["data"]], ["1"])
+
+        result = self.app.get("/articles?filter[title][ne]=x,y")
+        self.assertIs(len(result.json["data"]), 2)
+
+    def testFilteringReverseRelationship(self):
+        result = self.app.get("/articles/1/comments?filter[author]=2")
+        self.assertIs(len(result.json["data"]), len(COMMENT_BODIES))
+
+        result = self.app.get("/articles/1/comments?filter[author]=1")
+        self.assertIs(len(result.json["data"]), 0)
+
+        self.app.get("/articles/1/comments?filter[body]=First!", status=400)
+
+    def testFilteringWithInvalidParameters(self):
+        self.app.get("/people?filter[id]=1", status=400)
+        self.app.get("/people?filter[unknown]=1", status=400)
+        self.app.get("/people?filter[age][near]=18", status=400)
+        self.app.get("/photos?filter[title]=x", status=400)
+
+        # values are converted before any query is issued
+        for url in ["/people?filter[age]=abc", "/people?filter[age]=1,x",
+                    "/people?filter[age][gt]=", "/comments?filter[author]=a"]:
+            CountingSqliteDatabase.queries = 0
+            result = self.app.get(url, status=400)
+
+            self.assertEqual(CountingSqliteDatabase.queries, 0)
+            self.assertIn("filter[", result.json["errors"][0]["title"])
+
+    def testSorting(self):
+        result = self.app.get("/people?sort=-age")
+        JsonAPIValidator.validate(result.json)
+        self.assertEqual([r["id"] for r in result.json["data"]], ["2", "1"])
+
+        result = self.app.get("/people?sort=name")
+        self.assertEqual([r["id"] for r in result.json["data"]], ["2", "1"])
+
+        result = self.app.get("/articles?sort=-title")
+        self.assertEqual([r["id"] for r in result.json["data"]], ["2", "1"])
+
+        result = self.app.get("/articles/1/comments?sort=-body")
+        self.assertEqual([r["id"] for r in result.json["data"]], ["2", "1"])
+
+        result = self.app.get("/people?sort=-age&page[size]=1")
+        self.assertEqual([r["id"] for r in result.json["data"]], ["2"])
+        self.assertIn("sort=-age", result.json["links"]["next"])
+
+        result = self.app.get(result.json["links"]["next"])
+        self.assertEqual([r["id"] for r in result.json["data"]], ["1"])
+
+    def testSortingByRelationshipAttribute(self):
+        Comment.create(body="Meh.", article=1, author=1)
+
+        result = self.app.get("/comments?sort=author.name,-body")
+        JsonAPIValidator.validate(result.json)
+        self.assertEqual(
+            [r["id"] for r in result.json["data"]],
+            ["2", "1", "3"]
+        )
+
+        result = self.app.get("/comments?sort=-author.name")
+        self.assertEqual(
+            [r["id"] for r in result.json["data"]],
+            ["3", "1", "2"]
+        )
+
+        result = self.app.get(
+            "/comments?sort=article.author.name,author.name&filter[author]=2"
+        )
+        self.assertEqual([r["id"] for r in result.json["data"]], ["1", "2"])
+
+    def testSortingWithInvalidParameters(self):
+        self.app.get("/people?sort=id", status=400)
+        self.app.get("/people?sort=unknown", status=400)
+        self.app.get("/photos?sort=title", status=400)
+        self.app.get("/people?sort=age&page[cursor]=", status=400)
+
+        result = self.app.get("/articles?page[cursor]=abc", status=400)
+        self.assertIn("page[cursor]", result.json["errors"][0]["title"])
+
+    def testConditionalGet(self):
+        for url in ["/articles/1", "/articles", "/articles/1/comments",
+                    "/articles/1/relationships/comments",
+                    "/articles/1/author"]:
+            result = self.app.get(url)
+            etag = result.headers["ETag"]
+            self.assertTrue(etag.startswith('"'))
+
+            result = self.app.get(url, headers={"If-None-Match": etag})
+            self.assertEqual(result.status, "304 Not Modified")
+            self.assertEqual(result.body, "")
+
+            result = self.app.get(
+                url,
+                headers={"If-None-Match": '"other", W/' + etag}
+            )
+            self.assertEqual(result.status, "304 Not Modified")
+
+        etag = self.app.get("/articles/1").headers["ETag"]
+        self.app.patch_json("/articles/1", params={
+            u"data": {
+                u"type": u"article",
+                u"id": u"1",
+                u"attributes": {u"title": u"Changed"}
+            }
+        })
+
+        result = self.app.get("/articles/1", headers={"If-None-Match": etag})
+        self.assertEqual(result.status, "200 OK")
+        self.assertNotEqual(result.headers["ETag"], etag)
+
+    def testConditionalGetWithVersionField(self):
+        app = CorkscrewApplication(PHF)
+        app.register(Comment, endpoint="/comments")
+        app.register(
+            Article,
+            related={"comments": Comment},
+            endpoint="/articles",
+            version_field="created"
+        )
+        app = TestApp(app)
+
+        etag = app.get("/articles/1").headers["ETag"]
+        self.assertEqual(app.get("/articles/1").headers["ETag"], etag)
+
+        etags = {url: app.get(url).headers["ETag"]
+                 for url in ["/articles/1", "/articles"]}
+
+        def serialize(*args, **kwargs):
+            raise AssertionError("The article must not be serialized.")
+
+        # a matching entity tag is detected without serializing the article
+        serializer = app.app.context.get_serializer(Article)
+        serializer.serialize = serialize
+
+        for url, url_etag in etags.iteritems():
+            result = app.get(url, headers={"If-None-Match": url_etag})
+            self.assertEqual(result.status, "304 Not Modified")
+
+        del serializer.serialize
+
+        # the entity tag depends on the reverse relationships, too
+        Comment.create(body="Meh.", article=1, author=1)
+        result = app.get("/articles/1", headers={"If-None-Match": etag})
+        self.assertEqual(result.status, "200 OK")
+
+        # included resources are not covered by the version field
+        result = app.get("/articles/1?include=comments")
+        self.assertNotEqual(result.headers["ETag"], etag)
+
+    def testCachedResourcesWithVersionField(self):
+        app = self.createApp(
+            cache=ResourceCache(),
+            cached=True,
+            version_field="created"
+        )
+
+        etag = app.get("/articles/1").headers["ETag"]
+
+        # the hit sends the entity tag of the miss
+        result = app.get("/articles/1")
+        self.assertEqual(result.headers["ETag"], etag)
+
+        result = app.get("/articles/1", headers={"If-None-Match": etag})
+        self.assertEqual(result.status, "304 Not Modified")
+
+    def testPatchingChangesTheVersionField(self):
+        app = self.createApp(version_field="created")
+
+        def article(title):
+            return {u"type": u"article", u"id": u"1",
+                    u"attributes": {u"title": title}}
+
+        etag = app.get("/articles/1").headers["ETag"]
+        app.patch_json("/articles/1", params={u"data": article(u"Single")})
+
+        result = app.get("/articles/1", headers={"If-None-Match": etag})
+        self.assertEqual(result.status, "200 OK")
+
+        etag = result.headers["ETag"]
+        app.patch_json("/articles", params={u"data": [article(u"Bulk")]})
+
+        result = app.get("/articles/1", headers={"If-None-Match": etag})
+        self.assertEqual(result.status, "200 OK")
+
+        # children whose linkage is replaced through their parent
+        etag = app.get("/articles/2").headers["ETag"]
+        app.patch_json("/people/2/relationships/articles", params={
+            u"data": [{u"type": u"article", u"id": u"2"}]
+        })
+
+        result = app.get("/articles/2", headers={"If-None-Match": etag})
+        self.assertEqual(result.status, "200 OK")
+        self.assertEqual(
+            result.json["data"]["relationships"]["author"]["data"]["id"],
+            "2"
+        )
+
+        # revision counters are incremented
+        settings = self.createSettingsApp(version_field="flag")
+        Setting.insert(key="theme", value="dark").execute()
+
+        resource = {u"type": u"setting", u"id": u"theme",
+                    u"attributes": {u"value": u"light"}}
+        settings.patch_json("/settings/theme", params={u"data": resource})
+        settings.patch_json("/settings", params={u"data": [resource]})
+
+        self.assertEqual(Setting.get(Setting.key == "theme").flag, 9)
+
+
+        now = [0]
+        cache = ResourceCache(max_size=2, ttl=10, clock=lambda: now[0])
+
+        cache.set("a", "A", [("article", "1")])
+        cache.set("b", "B", [("article", "2")])
+        self.assertEqual(cache.get("a"), "A")
+
+        # b is the least recently used entry
+        cache.set("c", "C")
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("c"), "C")
+
+        cache.invalidate(("article", "1"))
+        self.assertIsNone(cache.get("a"))
+
+        now[0] = 10
+        self.assertIsNone(cache.get("c"))
+
+        self.assertEqual(cache.stats(), {
+            "hits": 2,
+            "misses": 3,
+            "evictions": 1,
+            "size": 1
+        })
+
+    def testCachedResources(self):
+        cache = ResourceCache()
+        app = self.createApp(cache=cache, cached=True)
+
+        CountingSqliteDatabase.queries = 0
+        first = app.get("/articles/1?include=author")
+        queries = CountingSqliteDatabase.queries
+
+        second = app.get("/articles/1?include=author")
+        self.assertEqual(second.body, first.body)
+        self.assertEqual(CountingSqliteDatabase.queries, queries)
+        self.assertEqual(cache.hits, 1)
+
+        # different fields and includes are different documents
+        app.get("/articles/1?fields[article]=title")
+        self.assertEqual(cache.misses, 2)
+
+        result = app.get(
+            "/articles/1",
+            headers={"If-None-Match": app.get("/articles/1").headers["ETag"]}
+        )
+        self.assertEqual(result.status, "304 Not Modified")
+
+        # writes to the resource itself
+        app.patch_json("/articles/1", params={
+            u"data": {
+                u"type": u"article",
+                u"id": u"1",
+                u"attributes": {u"title": u"Changed"}
+            }
+        })
+
+        result = app.get("/articles/1")
+        self.assertEqual(result.json["data"]["attributes"]["title"], "Changed")
+
+        # writes to included resources
+        app.patch_json("/people/1", params={
+            u"data": {
+                u"type": u"person",
+                u"id": u"1",
+                u"attributes": {u"name": u"Changed"}
+            }
+        })
+
+        result = app.get("/articles/1?include=author")
+        self.assertEqual(
+            result.json["included"][0]["attributes"]["name"],
+            "Changed"
+        )
+
+        # writes to resources in a to-many relationship
+        app.post_json("/comments", params={
+            u"data": {
+                u"type": u"comment",
+                u"attributes": {u"body": u"Meh."},
+                u"relationships": {
+                    u"article": {u"data": {u"type": u"article", u"id": u"1"}},
+                    u"author": {u"data": {u"type": u"person", u"id": u"1"}}
+                }
+            }
+        })
+
+        result = app.get("/articles/1")
+        self.assertIs(
+            len(result.json["data"]["relationships"]["comments"]["data"]),
+            3
+        )
+
+        # children that are moved by patching a to-many relationship
+        self.assertEqual(
+            app.get("/comments/1").json["data"]["relationships"]["article"][
+                "data"
+            ],
+            {u"id": u"1", u"type": u"article"}
+        )
+
+        app.patch_json("/articles/1/relationships/comments", params={
+            u"data": [{u"type": u"comment", u"id": u"2"}]
+        })
+
+        result = app.get("/comments/1")
+        self.assertIsNone(
+            result.json["data"]["relationships"]["article"]["data"]
+        )
+
+        app.delete("/comments/2")
+        app.get("/comments/2", status=404)
+
+    def testInvalidationsFollowTheTransaction(self):
+        depths = []
+
+        class Cache(ResourceCache):
+            def invalidate(self, *tags):
+                depths.append(database.transaction_depth())
+                super(Cache, self).invalidate(*tags)
+
+        app = self.createApp(cache=Cache(), cached=True)
+
+        def article(_id):
+            return {u"type": u"article", u"id": _id,
+                    u"attributes": {u"title": u"Changed"},
+                    u"relationships": {u"comments": {u"data": []}}}
+
+        app.patch_json("/articles/2", params={u"data": article(u"2")})
+        app.patch_json("/articles", params={u"data": [article(u"1")]})
+
+        self.assertTrue(depths)
+        self.assertEqual(set(depths), set([0]))
+
+    def testSharedCache(self):
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, "cache.db")
+
+        try:
+            # two worker processes with a cache on the same file
+            worker1 = self.createApp(
+                cache=ResourceCache(backend=SqliteBackend(path)),
+                cached=True
+            )
+            cache = ResourceCache(backend=SqliteBackend(path))
+            worker2 = self.createApp(cache=cache, cached=True)
+
+            first = worker1.get("/articles/1")
+            self.assertEqual(worker2.get("/articles/1").body, first.body)
+            self.assertEqual(cache.stats()["hits"], 1)
+
+            worker1.patch_json("/articles/1", params={
+                u"data": {
+                    u"type": u"article",
+                    u"id": u"1",
+                    u"attributes": {u"title": u"Changed"}
+                }
+            })
+
+            result = worker2.get("/articles/1")
+            self.assertEqual(
+                result.json["data"]["attributes"]["title"],
+                "Changed"
+            )
+            self.assertEqual(cache.stats()["hits"], 1)
+
+            backend = SqliteBackend(path, max_size=1)
+            backend.set("other", ["value", [], 0], 60)
+            self.assertEqual(backend.evictions, 1)
+            self.assertEqual(backend.size(), 1)
+
+            # hits do not write, their access times are kept for the next set
+            connection = sqlite3.connect(path)
+            query = "SELECT accessed FROM corkscrew_entries"
+            accessed = connection.execute(query).fetchall()
+
+            backend.get("other")
+            self.assertIn("other", backend.accessed)
+            self.assertEqual(connection.execute(query).fetchall(), accessed)
+            connection.close()
+
+        finally:
+            shutil.rmtree(directory)
+
+    def testInvalidationsExpire(self):
+        now = [0]
+        backend = MemoryBackend(clock=lambda: now[0])
+        cache = ResourceCache(ttl=10, clock=lambda: now[0], backend=backend)
+
+        cache.set("a", "A", [("article", "1")])
+        cache.invalidate(("article", "1"))
+        self.assertIsNone(cache.get("a"))
+
+        # entries expire ttl seconds after rendering started
+        now[0] = 5
+        cache.set("b", "B", [("article", "2")], since=0)
+        now[0] = 10
+        self.assertIsNone(cache.get("b"))
+
+        cache.invalidate(("article", "2"))
+        self.assertEqual(len(backend.invalidations), 1)
+
+    def testMemcachedBackend(self):
+        class Client(object):
+            """A memcached client that keeps the values in a dictionary."""
+
+            def __init__(self):
+                self.values = {}
+                self.gets = 0
+
+            def get(self, key):
+                self.gets += 1
+                return self.values.get(key)
+
+            def get_multi(self, keys):
+                self.gets += 1
+                return dict(
+                    (key, self.values[key]) for key in keys
+                    if key in self.values
+                )
+
+            def set(self, key, value, ttl=0):
+                self.assertValidTTL(ttl)
+                self.values[key] = value
+
+            def assertValidTTL(self, ttl):
+                if not isinstance(ttl, int) or ttl < 1:
+                    raise AssertionError("Invalid expiration: %r" % ttl)
+
+        client = Client()
+        cache = ResourceCache(ttl=0.5, backend=MemcachedBackend(client))
+        app = self.createApp(cache=cache, cached=True)
+
+        first = app.get("/articles/1?include=comments")
+        client.gets = 0
+
+        self.assertEqual(app.get("/articles/1?include=comments").body,
+                         first.body)
+        self.assertEqual(cache.hits, 1)
+
+        # the entry and the invalidations of all of its tags
+        self.assertEqual(client.gets, 2)
+
+        app.patch_json("/comments/1", params={
+            u"data": {
+                u"type": u"comment",
+                u"id": u"1",
+                u"attributes": {u"body": u"Changed"}
+            }
+        })
+
+        result = app.get("/articles/1?include=comments")
+        self.assertIn(
+            "Changed",
+            [r["attributes"]["body"] for r in result.json["included"]]
+        )
+
+    def testInvalidLinkageIsRejected(self):
+        def resource(relationships):
+            return {u"data": {
+                u"type": u"article",
+                u"id": u"1",
+                u"relationships": relationships
+            }}
+
+        for linkage in [
+            {u"type": u"person"},
+            {u"type": u"person", u"id": u"1", u"other": 1},
+            [{u"type": u"person", u"id": u"1"}, {u"id": u"2"}],
+            [u"1"],
+            u"1"
+        ]:
+            with self.assertRaises(AssertionError):
+                JsonAPIValidator.validate_jsonapi(
+                    resource({u"author": {u"data": linkage}})
+                )
+
+        JsonAPIValidator.validate_jsonapi(resource({
+            u"author": {u"data": None},
+            u"comments": {u"data": [{u"type": u"comment", u"id": u"1"}]}
+        }))
+
+    def testGetDatabase(self):
+        self.assertIs(util.get_database(Article), database.obj)
+        self.assertIs(util.get_database(database), database.obj)
+        self.assertIs(util.get_database(database.obj), database.obj)
+
+    def testMemberNames(self):
+        def message(key):
+            try:
+                JsonAPIValidator.validate_member_names({u"a": {key: 1}})
+            except AssertionError as e:
+                return str(e)
+
+        self.assertEqual(message(u""), M.AT_LEAST_ONE_CHAR)
+        self.assertEqual(message(u"-a"), M.ONLY_ALLOWED_CHARS)
+        self.assertEqual(message(u"a+b"), M.NAMES_MUST_USE_ALLOWED_CHARS)
+        self.assertEqual(message(u"a_"), M.NAMES_MUST_END_WITH_ALLOWED)
+        self.assertEqual(message(u"a\n"), M.NAMES_MUST_END_WITH_ALLOWED)
+
+        for key in [u"a", u"a1", u"a-b_c d", u"\xe4", u"a\u2603b", "ab"]:
+            self.assertIsNone(message(key))
+
     def testFetchingNullRelationship(self):
         result = self.app.get("/articles/1")
         rel = result.json["data"]["relationships"]["cover"]["links"]["related"]
@@ -331,6 +1254,91 @@ class TestCorkscrew(unittest.TestCase):
             self.assertIsNotNone(res.json)
             JsonAPIValidator.validate_jsonapi(res.json)
 
+    def testCreatedResourceIsNotReadBack(self):
+        request = {u"data": {
+            u"type": u"article",
+            u"attributes": {u"title": u"Written once"},
+            u"relationships": {
+                u"author": {u"data": {u"type": u"person", u"id": u"1"}}
+            }
+        }}
+
+        CountingSqliteDatabase.queries = 0
+        result = self.app.post_json("/articles", params=request)
+
+        # the INSERT statement only
+        self.assertEqual(CountingSqliteDatabase.queries, 1)
+
+        self.assertEqual(
+            result.json["data"],
+            self.app.get(result.location).json["data"]
+        )
+
+    def createSettingsApp(self, **options):
+        Setting.create_table()
+
+        app = CorkscrewApplication(PHF)
+        app.register(Setting, endpoint="/settings", **options)
+        return TestApp(app)
+
+    def testCreatingResourceWithClientGeneratedKey(self):
+        app = self.createSettingsApp()
+
+        result = app.post_json("/settings", params={u"data": {
+            u"type": u"setting",
+            u"id": u"theme",
+            u"attributes": {u"value": u"dark"}
+        }})
+
+        self.assertEqual(result.json["data"]["id"], "theme")
+        self.assertEqual(Setting.get(Setting.key == "theme").value, "dark")
+
+        # columns with a database default are not required either
+        self.assertEqual(Setting.get(Setting.key == "theme").flag, 7)
+
+        result = app.post_json("/settings", params={u"data": {
+            u"type": u"setting",
+            u"id": u"language",
+            u"attributes": {}
+        }}, status=400)
+        self.assertEqual(
+            result.json["errors"][0]["title"],
+            "value cannot be null"
+        )
+
+    def testCreatedResourceContainsDatabaseDefaults(self):
+        app = self.createSettingsApp()
+
+        def setting(key):
+            return {u"type": u"setting", u"id": key,
+                    u"attributes": {u"value": u"on"}}
+
+        CountingSqliteDatabase.queries = 0
+        result = app.post_json("/settings", params={u"data": setting(u"a")})
+
+        # the INSERT and one SELECT of the missing columns
+        self.assertEqual(CountingSqliteDatabase.queries, 2)
+
+        attributes = result.json["data"]["attributes"]
+        self.assertEqual(attributes["flag"], 7)
+        self.assertIsNotNone(attributes["created"])
+        self.assertEqual(
+            result.json["data"],
+            app.get("/settings/a").json["data"]
+        )
+
+        result = app.post_json("/settings", params={u"data": [
+            setting(u"b"),
+            setting(u"c")
+        ]})
+
+        for resource in result.json["data"]:
+            self.assertEqual(resource["attributes"]["flag"], 7)
+            self.assertEqual(
+                resource,
+                app.get("/settings/" + resource["id"]).json["data"]
+            )
+
     def testCreatingResourceWithMissingRequiredAttributeShouldFail(self):
         request = {
             u"data": {
@@ -348,6 +1356,333 @@ class TestCorkscrew(unittest.TestCase):
         JsonAPIValidator.validate_content_type(result.content_type)
         JsonAPIValidator.validate_jsonapi(result.json)
 
+    def testRequestSchema(self):
+        def person(**attributes):
+            return {u"data": {u"type": u"person", u"attributes": attributes}}
+
+        def article(**relationships):
+            return {u"data": {
+                u"type": u"article",
+                u"id": u"1",
+                u"relationships": dict(
+                    (name, {u"data": data})
+                    for name, data in relationships.iteritems()
+                )
+            }}
+
+        author = {u"type": u"person", u"id": u"1"}
+
+        for method, url, request, title in [
+            ("post", "/people", person(name=u"Eve", age=u"old"),
+             "The attribute 'age' must be an integer."),
+            ("post", "/people", person(name=u"Eve", age=True),
+             "The attribute 'age' must be an integer."),
+            ("post", "/people", person(name=1, age=1),
+             "The attribute 'name' must be a string."),
+            ("post", "/people", person(name=None, age=1),
+             "name cannot be null"),
+            ("post", "/people", person(name=u"Eve"),
+             "age cannot be null"),
+            ("post", "/people", person(name=u"Eve", age=1, height=2),
+             "Unknown attribute 'height'."),
+            ("post", "/comments", {u"data": {
+                u"type": u"comment",
+                u"attributes": {u"body": u"Meh."}
+            }}, "author cannot be null"),
+            ("patch", "/articles/1", article(author=None),
+             "author cannot be null"),
+            ("patch", "/articles/1", article(author=[author]),
+             "The resource linkage of 'author' must be a single resource "
+             "identifier or null."),
+            ("patch", "/articles/1", article(comments=author),
+             "The resource linkage of 'comments' must be a list of resource "
+             "identifiers."),
+            ("patch", "/articles/1", article(editor=author),
+             "Encountered unknown relationship field: 'editor'.")
+        ]:
+            CountingSqliteDatabase.queries = 0
+            result = getattr(self.app, method + "_json")(
+                url,
+                params=request,
+                status=400
+            )
+
+            # invalid documents are rejected before any query is issued
+            self.assertEqual(CountingSqliteDatabase.queries, 0)
+            self.assertEqual(result.json["errors"][0]["title"], title)
+
+        self.app.post_json("/people", params=person(name=u"Eve", age=30))
+        self.app.patch_json("/articles/1", params=article(cover=None))
+
+    def testBulkCreate(self):
+        created = []
+
+        class BulkListener(Listener):
+            def after_bulk_create(self, entries):
+                created.append(entries)
+
+        app = CorkscrewApplication(PHF)
+        app.register(Person, endpoint="/people")
+        app.register(
+            Article,
+            endpoint="/articles",
+            listener=BulkListener()
+        )
+        app = TestApp(app)
+
+        def article(title, _id=None):
+            resource = {
+                u"type": u"article",
+                u"attributes": {u"title": title},
+                u"relationships": {
+                    u"author": {u"data": {u"type": u"person", u"id": u"2"}}
+                }
+            }
+
+            if _id:
+                resource[u"id"] = _id
+
+            return resource
+
+        articles = [article(u"Bulk {}".format(i)) for i in xrange(250)]
+        articles.append(article(u"Client", u"1000"))
+        articles.append(article(u"Last"))
+
+        CountingSqliteDatabase.queries = 0
+        result = app.post_json("/articles", params={u"data": articles})
+        JsonAPIValidator.validate(result.json)
+
+        # a few INSERT statements and no SELECT for each row
+        self.assertLess(CountingSqliteDatabase.queries, 10)
+        self.assertIs(len(created), 1)
+        self.assertIs(len(created[0]), 252)
+
+        data = result.json["data"]
+        self.assertEqual(
+            [r["id"] for r in data],
+            [unicode(i) for i in xrange(3, 253)] + [u"1000", u"1001"]
+        )
+
+        for resource in [data[0], data[249], data[250], data[251]]:
+            expected = app.get("/articles/" + resource["id"]).json["data"]
+            self.assertEqual(resource, expected)
+
+        # invalid documents are rejected as a whole
+        count = Article.select().count()
+        articles = [article(u"Valid"), {u"type": u"article"}]
+        app.post_json("/articles", params={u"data": articles}, status=400)
+        self.assertEqual(Article.select().count(), count)
+
+        # so are resources of another type
+        articles = [article(u"Valid"), dict(article(u"Other"), type=u"person")]
+        app.post_json("/articles", params={u"data": articles}, status=409)
+        app.post_json("/people", params={u"data": article(u"x")}, status=409)
+        self.assertEqual(Article.select().count(), count)
+
+    def testBulkPatchAndDelete(self):
+        deleted = []
+
+        class BulkListener(Listener):
+            def after_bulk_delete(self, keys):
+                deleted.append(keys)
+
+        app = CorkscrewApplication(PHF)
+        app.register(Person, endpoint="/people")
+        app.register(
+            Comment,
+            endpoint="/comments",
+            filterable=["author"],
+            listener=BulkListener()
+        )
+        app = TestApp(app)
+
+        def comment(_id, body=None, author=None):
+            resource = {u"type": u"comment", u"id": _id}
+
+            if body:
+                resource[u"attributes"] = {u"body": body}
+
+            if author:
+                resource[u"relationships"] = {
+                    u"author": {u"data": {u"type": u"person", u"id": author}}
+                }
+
+            return resource
+
+        CountingSqliteDatabase.queries = 0
+        app.patch_json("/comments", params={u"data": [
+            comment(u"1", u"Patched", u"1"),
+            comment(u"2", u"Also patched")
+        ]}, status=204)
+
+        # one SELECT for the existence check and one UPDATE
+        self.assertLess(CountingSqliteDatabase.queries, 5)
+
+        first = Comment.get(Comment.id == 1)
+        second = Comment.get(Comment.id == 2)
+        self.assertEqual(first.body, u"Patched")
+        self.assertEqual(first.author.id, 1)
+        self.assertEqual(second.body, u"Also patched")
+        self.assertEqual(second.author.id, 2)
+
+        # the request fails as a whole if a resource does not exist
+        app.patch_json("/comments", params={u"data": [
+            comment(u"1", u"Lost"),
+            comment(u"99", u"Missing")
+        ]}, status=404)
+        self.assertEqual(Comment.get(Comment.id == 1).body, u"Patched")
+
+        result = app.patch_json("/comments", params={u"data": [
+            {u"type": u"comment", u"attributes": {u"body": u"x"}}
+        ]}, expect_errors=True)
+        self.assertEqual(
+            result.json["errors"][0]["title"],
+            M.ID_REQUIRED
+        )
+
+        # deleting by resource identifiers
+        app.delete("/comments", status=404, params=app.app.encoder.dumps(
+            {u"data": [comment(u"1"), comment(u"99")]}
+        ))
+        self.assertEqual(Comment.select().count(), 2)
+
+        app.delete("/comments", status=204, params=app.app.encoder.dumps(
+            {u"data": [comment(u"1")]}
+        ))
+        self.assertEqual(deleted, [[1]])
+
+        # deleting by filter, but never the whole collection
+        app.delete("/comments", status=400)
+        app.delete("/comments?filter[author]=2", status=204)
+        self.assertEqual(deleted, [[1], [2]])
+        self.assertEqual(Comment.select().count(), 0)
+
+    def testBulkPatchCallsPerResourceHooks(self):
+        patching = []
+
+        class PatchListener(Listener):
+            def before_patch(self, request):
+                patching.append(request["data"]["id"])
+
+            def after_patch(self, response):
+                return True
+
+        app = CorkscrewApplication(PHF)
+        app.register(Person, endpoint="/people")
+        app.register(
+            Comment,
+            endpoint="/comments",
+            listener=PatchListener()
+        )
+        app = TestApp(app)
+
+        result = app.patch_json("/comments", params={u"data": [
+            {u"type": u"comment", u"id": u"2", u"attributes": {u"body": u"A"}},
+            {u"type": u"comment", u"id": u"1", u"attributes": {u"body": u"B"}}
+        ]})
+
+        self.assertEqual(patching, [u"2", u"1"])
+        self.assertEqual(
+            [r["attributes"]["body"] for r in result.json["data"]],
+            [u"A", u"B"]
+        )
+
+    def testOperations(self):
+        self.app.app.register_operations()
+
+        def person(_id):
+            return {u"data": {u"type": u"person", u"id": _id}}
+
+        result = self.app.post_json("/operations", params={
+            u"atomic:operations": [{
+                u"op": u"add",
+                u"data": {
+                    u"type": u"article",
+                    u"lid": u"new",
+                    u"attributes": {u"title": u"Atomic"},
+                    u"relationships": {u"author": person(u"1")}
+                }
+            }, {
+                u"op": u"add",
+                u"data": {
+                    u"type": u"comment",
+                    u"attributes": {u"body": u"Together"},
+                    u"relationships": {
+                        u"author": person(u"2"),
+                        u"article": {u"data": {
+                            u"type": u"article",
+                            u"lid": u"new"
+                        }}
+                    }
+                }
+            }, {
+                u"op": u"update",
+                u"ref": {
+                    u"type": u"photo",
+                    u"id": u"1",
+                    u"relationship": u"tags"
+                },
+                u"data": [{u"type": u"tag", u"id": u"1"}]
+            }, {
+                u"op": u"update",
+                u"data": {
+                    u"type": u"article",
+                    u"lid": u"new",
+                    u"attributes": {u"title": u"Atomic Update"}
+                }
+            }, {
+                u"op": u"remove",
+                u"ref": {u"type": u"comment", u"id": u"1"}
+            }]
+        })
+
+        results = result.json["atomic:results"]
+        self.assertIs(len(results), 5)
+
+        article = results[0]["data"]
+        comment = results[1]["data"]
+        self.assertEqual(
+            comment["relationships"]["article"]["data"]["id"],
+            article["id"]
+        )
+        self.assertEqual(
+            results[3]["data"]["attributes"]["title"],
+            u"Atomic Update"
+        )
+        self.assertEqual(results[2], {})
+        self.assertEqual(results[4], {})
+
+        result = self.app.get("/photos/1/relationships/tags")
+        self.assertEqual(
+            result.json["data"],
+            [{u"type": u"tag", u"id": u"1"}]
+        )
+        self.app.get("/comments/1", status=404)
+
+        # all operations are rolled back if one of them fails
+        articles = Article.select().count()
+        self.app.post_json("/operations", status=404, params={
+            u"atomic:operations": [{
+                u"op": u"add",
+                u"data": {
+                    u"type": u"article",
+                    u"attributes": {u"title": u"Rolled back"},
+                    u"relationships": {u"author": person(u"1")}
+                }
+            }, {
+                u"op": u"remove",
+                u"ref": {u"type": u"comment", u"id": u"99"}
+            }]
+        })
+        self.assertEqual(Article.select().count(), articles)
+
+        self.app.post_json("/operations", status=400, params={
+            u"atomic:operations": [{
+                u"op": u"remove",
+                u"ref": {u"type": u"comment", u"lid": u"unknown"}
+            }]
+        })
+
     def testCreateResourceWithAlreadyExistingId(self):
         request = {
             u"data": {
@@ -455,6 +1790,36 @@ class TestCorkscrew(unittest.TestCase):
         # the resource should be gone now
         self.app.get("/photos/1", status=404)
 
+    def testSingleStatementWrites(self):
+        request = {u"data": {
+            u"type": u"article",
+            u"id": u"1",
+            u"attributes": {u"title": u"One statement"},
+            u"relationships": {
+                u"author": {u"data": {u"type": u"person", u"id": u"2"}}
+            }
+        }}
+
+        created = Article.get(Article.id == 1).created
+
+        CountingSqliteDatabase.queries = 0
+        self.app.patch_json("/articles/1", params=request, status=204)
+        self.assertEqual(CountingSqliteDatabase.queries, 1)
+
+        article = Article.get(Article.id == 1)
+        self.assertEqual(article.title, u"One statement")
+        self.assertEqual(article.author.id, 2)
+        self.assertEqual(article.created, created)
+
+        request[u"data"][u"id"] = u"99"
+        self.app.patch_json("/articles/99", params=request, status=404)
+
+        CountingSqliteDatabase.queries = 0
+        self.app.delete("/comments/1", status=204)
+        self.assertEqual(CountingSqliteDatabase.queries, 1)
+
+        self.app.delete("/comments/1", status=404)
+
     def testFetchingRelatedOneToNResource(self):
         result = self.app.get("/articles/1/comments")
         JsonAPIValidator.validate_jsonapi(result.json)
@@ -526,6 +1891,51 @@ class TestCorkscrew(unittest.TestCase):
         result = self.app.get("/articles/2/cover")
         self.assertIsNone(result.json["data"])
 
+    def testReplacingOneToNRelationship(self):
+        Comment.insert_many([
+            {"body": u"Comment {}".format(i), "author": 1, "article": 2}
+            for i in xrange(100)
+        ]).execute()
+
+        kept = [
+            c.id for c in Comment.select().where(Comment.article == 2)
+        ][::2]
+
+        request = {u"data": [
+            {u"type": u"comment", u"id": unicode(_id)} for _id in kept + [1]
+        ]}
+
+        CountingSqliteDatabase.queries = 0
+        self.app.patch_json(
+            "/articles/2/relationships/comments",
+            params=request,
+            status=204
+        )
+
+        # independent of the number of comments
+        self.assertLess(CountingSqliteDatabase.queries, 10)
+
+        self.assertEqual(
+            sorted(c.id for c in Comment.select().where(Comment.article == 2)),
+            sorted(kept + [1])
+        )
+        self.assertEqual(
+            Comment.select().where(Comment.article >> None).count(),
+            50
+        )
+
+        # unknown comments fail the whole request
+        request[u"data"] = [{u"type": u"comment", u"id": u"999"}]
+        self.app.patch_json(
+            "/articles/2/relationships/comments",
+            params=request,
+            status=404
+        )
+        self.assertEqual(
+            Comment.select().where(Comment.article == 2).count(),
+            51
+        )
+
     def testPatchingRelatedOneToMResource(self):
         result = self.app.get("/articles/1/relationships/comments")
         self.assertIsInstance(result.json["data"], list)
@@ -560,6 +1970,26 @@ class TestCorkscrew(unittest.TestCase):
         self.assertIsInstance(result.json["data"], list)
         self.assertIs(len(result.json["data"]), 1)
 
+    def testReplacingNToMRelationshipOnlyWritesDifferences(self):
+        tag = Tag.create(name=u"new")
+        kept = PhotoTag.get(PhotoTag.tag == 2)
+
+        self.app.patch_json("/photos/1/relationships/tags", params={
+            u"data": [
+                {u"type": u"tag", u"id": u"2"},
+                {u"type": u"tag", u"id": unicode(tag.id)}
+            ]
+        })
+
+        rows = list(PhotoTag.select().where(PhotoTag.photo == 1))
+        self.assertEqual(
+            sorted(row.tag.id for row in rows),
+            [2, tag.id]
+        )
+
+        # the unchanged link was not deleted and inserted again
+        self.assertIn(kept.id, [row.id for row in rows])
+
     def testGetNToMRelationship(self):
         result = self.app.get("/photos/1/tags")
         JsonAPIValidator.validate(result.json)
@@ -665,6 +2095,16 @@ class TestCorkscrew(unittest.TestCase):
                 inc["links"]["self"]
             )
 
+    def testIncludedResourcesAreNotDuplicated(self):
+        result = self.app.get("/articles?include=comments.article,author")
+        JsonAPIValidator.validate(result.json)
+
+        keys = [(inc["type"], inc["id"]) for inc in result.json["included"]]
+        self.assertEqual(len(keys), len(set(keys)))
+
+        # the articles are primary data and must not be included again
+        self.assertNotIn("article", [key[0] for key in keys])
+
     def testIncludeParameterWithInvalidFields(self):
         self.app.get("/articles/1?include=invalid-field", status=400)
         self.app.get("/articles/1?include=author,invalid-field", status=400)